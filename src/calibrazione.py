@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Calibrazione automatica dello spettro: ricerca dei picchi e fit (gaussiana + fondo lineare) sui dati binnati."""
+from __future__ import annotations
+from typing import Any, Literal, NamedTuple
+import numpy as np
+from log import getLogger
+from hist import Histogram
+
+
+L = getLogger(__name__)  # Il logger associato a questo modulo
+
+# Righe di riferimento: (energia in keV, posizione nominale in unità di area)
+#   le posizioni sono quelle lette a occhio sul grafico, e servono soltanto come punto di partenza della ricerca
+LINES: list[tuple[float, float]] = [
+    (1436, 118900),  # 138La -> 138Ba (picco centrale)
+    (2600, 211400),  # 227Ac (primo picco)
+]
+# Semiampiezza della finestra di ricerca attorno alla posizione nominale (relativa)
+SEARCH: float = 0.15
+# Larghezza (in bin) della gaussiana usata per lisciare lo spettro
+SMOOTH: float = 3
+# Larghezza della finestra di stima del fondo, relativa alla posizione del picco (deve superare la larghezza del picco)
+BACKGROUND: float = 0.1
+# Semiampiezza dell'intervallo del fit, in deviazioni standard del picco
+FIT_RANGE: float = 2.5
+# Significatività minima (altezza del picco diviso la sua incertezza) perché un picco venga accettato
+MIN_SIGNIFICANCE: float = 5
+
+
+class Peak(NamedTuple):
+    """Il risultato del fit di un picco."""
+
+    energy:    float  # Energia della riga (keV)
+    position:  float  # Posizione del picco (in unità di area)...
+    dposition: float  # ... e la sua incertezza
+    sigma:     float  # Deviazione standard del picco...
+    dsigma:    float  # ... e la sua incertezza
+    amplitude: float  # Altezza del picco (conteggi per bin) al di sopra del fondo
+    chi2:      float  # Chi quadro del fit...
+    ndf:       int    # ... e gradi di libertà
+
+
+class Calibration(NamedTuple):
+    """Una calibrazione lineare: energia = m · area + q."""
+
+    m:     float  # Coefficiente angolare (keV per unità di area)...
+    dm:    float  # ... e la sua incertezza
+    q:     float  # Intercetta (keV)...
+    dq:    float  # ... e la sua incertezza
+    cov:   float  # Covarianza tra `m` e `q`
+    peaks: tuple[Peak, ...]  # I picchi utilizzati
+
+    def to_dict(self) -> dict[str, Any]:
+        """Converte la calibrazione (con i picchi utilizzati) in un dizionario (serializzabile, ad esempio, in JSON)."""
+        return dict(
+            m=self.m, dm=self.dm, q=self.q, dq=self.dq, cov=self.cov,
+            peaks=[{key: float(value) for key, value in peak._asdict().items()} for peak in self.peaks],
+        )
+
+    def __call__(self, x: np.ndarray | float) -> np.ndarray | float:
+        """Converte le aree `x` in energie (keV)."""
+        return self.m * x + self.q
+
+    def error(self, x: np.ndarray | float) -> np.ndarray | float:
+        """L'incertezza sull'energia corrispondente alle aree `x` (dovuta alla calibrazione)."""
+        return np.sqrt((x * self.dm) ** 2 + self.dq**2 + 2 * x * self.cov)
+
+
+def smooth(counts: np.ndarray, width: float = SMOOTH) -> np.ndarray:
+    """Liscia lo spettro `counts` con una gaussiana di deviazione standard `width` (in bin)."""
+    half = int(np.ceil(4 * width))
+    kernel = np.exp(-0.5 * (np.arange(-half, half + 1) / width) ** 2)
+    kernel /= kernel.sum()
+    # Ai bordi, lo spettro viene esteso ripetendo il primo e l'ultimo valore
+    padded = np.pad(np.asarray(counts, dtype=np.float64), half, mode="edge")
+    return np.convolve(padded, kernel, mode="valid")
+
+
+def background(counts: np.ndarray, width: int) -> np.ndarray:
+    """Stima il fondo dello spettro `counts` con l'algoritmo SNIP, eliminando le strutture più strette di `width` bin.
+
+    Ad ogni passo `p` (da 1 a `width`), ogni bin viene sostituito dalla media dei bin a distanza `p`,
+    se è minore; per ridurre la dinamica, l'algoritmo lavora su log(log(√(y + 1) + 1) + 1).
+    """
+    v = np.log(np.log(np.sqrt(np.maximum(counts, 0) + 1) + 1) + 1)
+    for p in range(1, width + 1):
+        if 2 * p >= len(v):
+            break
+        v[p:-p] = np.minimum(v[p:-p], (v[:-2 * p] + v[2 * p:]) / 2)
+    return (np.exp(np.exp(v) - 1) - 1) ** 2 - 1
+
+
+def _clip(spectrum: Histogram, position: float, relative: float) -> int:
+    """Larghezza (in bin) della finestra di stima del fondo attorno a `position`."""
+    index = min(max(int(np.searchsorted(spectrum.edges, position)) - 1, 0), spectrum.bins - 1)
+    return max(1, int(round(relative * position / spectrum.widths[index])))
+
+
+def find_peak(
+    spectrum: Histogram, lo: float, hi: float, width: float = SMOOTH, relative: float = BACKGROUND
+) -> int:
+    """Trova il picco più evidente dello spettro tra `lo` e `hi`, e ne restituisce l'indice del bin.
+
+    Dallo spettro lisciato viene sottratto il fondo (stimato con `background()`): rimangono soltanto i picchi.
+    """
+    s = smooth(spectrum.counts, width)
+    excess = s - background(s, _clip(spectrum, (lo + hi) / 2, relative))
+    centers = spectrum.centers
+    inside = np.flatnonzero((centers >= lo) & (centers <= hi))
+    if not len(inside):
+        raise ValueError(f"The search window [{lo:g}, {hi:g}] is outside the spectrum.")
+    return int(inside[np.argmax(excess[inside])])
+
+
+def _model(p: np.ndarray, x: np.ndarray, x0: float) -> tuple[np.ndarray, np.ndarray]:
+    """Gaussiana più fondo lineare, e la sua jacobiana rispetto ai parametri (A, μ, σ, b0, b1)."""
+    A, mu, sigma, b0, b1 = p
+    t = (x - mu) / sigma
+    g = np.exp(-0.5 * t * t)
+    y = A * g + b0 + b1 * (x - x0)
+    J = np.stack([g, A * g * t / sigma, A * g * t * t / sigma, np.ones_like(x), x - x0], axis=1)
+    return y, J
+
+
+def fit_peak(
+    spectrum: Histogram, index: int, energy: float = float("nan"), *,
+    width: float = SMOOTH, relative: float = BACKGROUND, fit_range: float = FIT_RANGE,
+    min_significance: float = MIN_SIGNIFICANCE, max_iter: int = 100,
+) -> Peak:
+    """Fit (ai minimi quadrati, con errori di Poisson) di una gaussiana più fondo lineare attorno al bin `index`.
+
+    Il fit usa l'algoritmo di Levenberg-Marquardt, su qualche decina di bin: il costo non dipende dal numero di eventi.
+    """
+    x = spectrum.centers
+    y = spectrum.counts.astype(np.float64)
+    s = smooth(y, width)
+
+    # --- Stime iniziali, dallo spettro lisciato (senza fondo) ---
+    excess = s - background(s, _clip(spectrum, float(x[index]), relative))
+    top = excess[index]
+    # Larghezza a metà altezza
+    left = index
+    while left > 0 and excess[left] > top / 2:
+        left -= 1
+    right = index
+    while right < len(s) - 1 and excess[right] > top / 2:
+        right += 1
+    sigma = max((x[right] - x[left]) / 2.355, float(spectrum.widths[index]))
+    mu = float(x[index])
+
+    # --- Intervallo del fit ---
+    sel = (x >= mu - fit_range * sigma) & (x <= mu + fit_range * sigma)
+    if np.count_nonzero(sel) < 8:
+        raise ValueError(f"Too few bins around {mu:g} to fit a peak.")
+    xs, ys = x[sel], y[sel]
+    w = 1 / np.maximum(ys, 1)  # Pesi di Poisson (almeno un conteggio, per i bin vuoti)
+    # Fondo: il suo valore sotto il picco, e la pendenza tra gli estremi dell'intervallo
+    b0 = s[index] - top
+    b1 = (ys[-3:].mean() - ys[:3].mean()) / (xs[-1] - xs[0])
+    p = np.array([max(top, 1.0), mu, sigma, b0, b1])
+
+    # --- Levenberg-Marquardt ---
+    f, J = _model(p, xs, mu)
+    chi2 = float(np.sum(w * (ys - f) ** 2))
+    lam = 1e-3
+    for _ in range(max_iter):
+        JTW = J.T * w
+        H = JTW @ J
+        step = np.linalg.solve(H + lam * np.diag(np.diag(H)), JTW @ (ys - f))
+        q = p + step
+        if q[2] > 0:
+            f2, J2 = _model(q, xs, mu)
+            chi2_new = float(np.sum(w * (ys - f2) ** 2))
+        else:
+            chi2_new = np.inf
+        if chi2_new <= chi2:
+            done = chi2 - chi2_new <= 1e-9 * chi2
+            p, f, J, chi2 = q, f2, J2, chi2_new
+            lam = max(lam / 10, 1e-12)
+            if done:
+                break
+        else:
+            lam *= 10
+            if lam > 1e12:
+                break
+    JTW = J.T * w
+    cov = np.linalg.inv(JTW @ J)
+    A, mu, sigma = p[:3]
+    if not xs[0] <= mu <= xs[-1]:
+        raise ValueError(f"The fit around {x[index]:g} did not converge to a peak.")
+    if A < min_significance * np.sqrt(cov[0, 0]):
+        raise ValueError(f"No significant peak around {x[index]:g} ({A / np.sqrt(cov[0, 0]):.1f} σ).")
+    return Peak(
+        energy, float(mu), float(np.sqrt(cov[1, 1])), float(sigma), float(np.sqrt(cov[2, 2])),
+        float(A), chi2, len(xs) - len(p),
+    )
+
+
+def calibrate(
+    spectrum: Histogram,
+    mode: Literal[0, 1] = 0,
+    lines: list[tuple[float, float]] | None = None,
+    search: float = SEARCH,
+) -> Calibration:
+    """Calibra lo spettro (delle aree) `spectrum`, cercando e fittando i picchi delle righe `lines`.
+
+    Con `mode` 0, la retta passa per l'origine e per il primo picco; con `mode` 1, per i primi due picchi
+    (come `spettro.CALIBRATION_MODE`). Le incertezze sono propagate da quelle sulle posizioni dei picchi.
+    """
+    lines = LINES if lines is None else lines
+    needed = 1 if mode == 0 else 2
+    if len(lines) < needed:
+        raise ValueError(f"Calibration mode {mode} needs {needed} lines.")
+    peaks: list[Peak] = []
+    with L.task("Calibrating spectrum...") as calibrating:
+        for energy, nominal in lines[:needed]:
+            index = find_peak(spectrum, nominal * (1 - search), nominal * (1 + search))
+            peak = fit_peak(spectrum, index, energy)
+            calibrating.info(
+                f"{energy:g} keV: peak at {peak.position:.1f} ± {peak.dposition:.1f} "
+                f"(σ = {peak.sigma:.1f}, χ²/ndf = {peak.chi2:.1f}/{peak.ndf})"
+            )
+            peaks.append(peak)
+        if mode == 0:
+            (Y1, X1, dX1), = [(p.energy, p.position, p.dposition) for p in peaks]
+            m = Y1 / X1
+            result = Calibration(m, m * dX1 / X1, 0.0, 0.0, 0.0, tuple(peaks))
+        else:
+            (Y1, X1, dX1), (Y2, X2, dX2) = [(p.energy, p.position, p.dposition) for p in peaks]
+            m = (Y1 - Y2) / (X1 - X2)
+            q = Y1 - m * X1
+            # Derivate di m e q rispetto a X1 e X2
+            dm1, dm2 = -m / (X1 - X2), m / (X1 - X2)
+            dq1, dq2 = -m - X1 * dm1, -X1 * dm2
+            result = Calibration(
+                m, float(np.hypot(dm1 * dX1, dm2 * dX2)),
+                q, float(np.hypot(dq1 * dX1, dq2 * dX2)),
+                dm1 * dq1 * dX1**2 + dm2 * dq2 * dX2**2,
+                tuple(peaks),
+            )
+        calibrating.result = (
+            f"m = {result.m:.6g} ± {result.dm:.2g} keV/area, q = {result.q:.4g} ± {result.dq:.2g} keV"
+        )
+    return result
+
+
+def test():
+    """Calibra uno spettro simulato, con i picchi nelle posizioni nominali."""
+    rng = np.random.default_rng(0)
+    areas = np.concatenate([
+        rng.exponential(60000, 2_000_000),
+        rng.normal(LINES[0][1], 3000, 20000),
+        rng.normal(LINES[1][1], 4500, 8000),
+    ])
+    spectrum = Histogram.linear(0, 250000, 2500).fill(areas)
+    for mode in (0, 1):
+        calibration = calibrate(spectrum, mode)  # type: ignore
+        L.info(f"Mode {mode}: 1436 keV -> {calibration(LINES[0][1]):.2f} ± {calibration.error(LINES[0][1]):.2f} keV")
+
+
+# Chiama "test()" quando il programma viene eseguito direttamente
+if __name__ == "__main__":
+    test()
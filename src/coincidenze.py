@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Eventi vicini nel tempo: coincidenze, pile-up e tempo morto, sui tempi ordinati (con NumPy)."""
+from __future__ import annotations
+from typing import Iterable
+from enum import IntFlag
+import numpy as np
+from log import getLogger
+
+
+L = getLogger(__name__)  # Il logger associato a questo modulo
+
+
+class Timing(IntFlag):
+    """Flag (combinabili con «|») che descrivono la posizione nel tempo di un evento rispetto agli altri."""
+
+    NONE = 0
+    # Un altro evento lo precede di al massimo `tau`
+    PILEUP_BEFORE = 1
+    # Un altro evento lo segue di al massimo `tau`
+    PILEUP_AFTER = 2
+    # Un evento qualsiasi entro `tau`
+    PILEUP = PILEUP_BEFORE | PILEUP_AFTER
+    # Arriva durante il tempo morto (paralizzabile) dovuto all'evento precedente
+    DEAD = 4
+
+
+class TimeIndex:
+    """Un indice sui tempi (ordinati) degli eventi, per trovare in O(n) quelli vicini tra loro.
+
+    I risultati per evento sono sempre nell'ordine originale degli eventi, anche se i tempi non sono ordinati.
+
+    Esempio
+    -------
+    >>> index = TimeIndex([0, 100, 105, 300, 302, 303])
+    >>> index.neighbours(5).tolist()
+    [0, 1, 1, 2, 2, 2]
+    >>> index.flags(3, dead=50).tolist()  # PILEUP_BEFORE = 1, PILEUP_AFTER = 2, DEAD = 4
+    [0, 0, 4, 2, 7, 5]
+    >>> index.dead_time(50)
+    158
+    """
+
+    # --- Variabili d'istanza ---
+    times: np.ndarray          # I tempi, in ordine crescente
+    order: np.ndarray | None   # La posizione originale di ciascun tempo in `times` (`None` se erano già ordinati)
+
+    def __init__(self, timestamps: Iterable[int] | np.ndarray) -> None:
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        if np.all(timestamps[1:] >= timestamps[:-1]):
+            self.times = timestamps
+            self.order = None
+        else:
+            self.order = np.argsort(timestamps, kind="stable")
+            self.times = timestamps[self.order]
+
+    def __len__(self) -> int:
+        """Il numero di eventi."""
+        return len(self.times)
+
+    def _original(self, values: np.ndarray) -> np.ndarray:
+        """Riporta i valori (uno per tempo in `times`) nell'ordine originale degli eventi."""
+        if self.order is None:
+            return values
+        result = np.empty_like(values)
+        result[self.order] = values
+        return result
+
+    def _events(self, positions: np.ndarray) -> np.ndarray:
+        """Gli indici originali degli eventi nelle posizioni (in `times`) `positions`."""
+        return positions if self.order is None else self.order[positions]
+
+    def gaps(self) -> np.ndarray:
+        """Il tempo trascorso dall'evento precedente.
+
+        Il primo evento ha un intervallo infinito (qui, il massimo intero).
+        """
+        gaps = np.empty_like(self.times)
+        gaps[:1] = np.iinfo(np.int64).max
+        gaps[1:] = np.diff(self.times)
+        return self._original(gaps)
+
+    def neighbours(self, tau: int) -> np.ndarray:
+        """Il numero di altri eventi entro `tau` (estremi compresi) da ciascun evento."""
+        lo = np.searchsorted(self.times, self.times - tau, side="left")
+        hi = np.searchsorted(self.times, self.times + tau, side="right")
+        return self._original(hi - lo - 1)
+
+    def pairs(self, tau: int) -> tuple[np.ndarray, np.ndarray]:
+        """Tutte le coppie di eventi (indici originali, il primo precede il secondo) a distanza al massimo `tau`."""
+        hi = np.searchsorted(self.times, self.times + tau, side="right")
+        # L'evento `i` è in coppia con quelli in `i + 1, ..., hi[i] - 1`
+        counts = hi - np.arange(len(self)) - 1
+        first = np.repeat(np.arange(len(self)), counts)
+        # Posizione di ciascuna coppia all'interno del gruppo del suo primo evento
+        starts = np.cumsum(counts) - counts
+        second = first + 1 + np.arange(len(first)) - np.repeat(starts, counts)
+        return self._events(first), self._events(second)
+
+    def flags(self, tau: int, dead: int = 0) -> np.ndarray:
+        """Le flag `Timing` di ciascun evento, con finestra di pile-up `tau` e tempo morto `dead`."""
+        gaps = np.diff(self.times)
+        flags = np.zeros(len(self), dtype=np.uint8)
+        flags[1:][gaps <= tau] |= np.uint8(Timing.PILEUP_BEFORE)
+        flags[:-1][gaps <= tau] |= np.uint8(Timing.PILEUP_AFTER)
+        # Tempo morto paralizzabile: ogni evento (anche se perso) lo estende
+        flags[1:][gaps < dead] |= np.uint8(Timing.DEAD)
+        return self._original(flags)
+
+    def dead_time(self, dead: int) -> int:
+        """Il tempo morto totale (paralizzabile): l'unione degli intervalli `[t, t + dead)` di tutti gli eventi."""
+        if not len(self):
+            return 0
+        return int(np.minimum(np.diff(self.times), dead).sum()) + dead
+
+    def live_time(self, dead: int) -> int:
+        """Il tempo vivo tra il primo evento e la fine del tempo morto dell'ultimo."""
+        if not len(self):
+            return 0
+        return int(self.times[-1] - self.times[0]) + dead - self.dead_time(dead)
+
+
+def flags(timestamps: Iterable[int] | np.ndarray, tau: int, dead: int = 0) -> np.ndarray:
+    """Le flag `Timing` di ciascun evento (vedi `TimeIndex.flags()`)."""
+    return TimeIndex(timestamps).flags(tau, dead)
+
+
+def accepted(flags: np.ndarray, reject: Timing = Timing.PILEUP | Timing.DEAD) -> np.ndarray:
+    """La maschera degli eventi che non hanno nessuna delle flag `reject`."""
+    return (np.asarray(flags) & int(reject)) == 0
+
+
+def test():
+    """Confronta i risultati con un calcolo a coppie (O(n²)), su tempi casuali."""
+    rng = np.random.default_rng(0)
+    timestamps = rng.integers(0, 10_000, 2000)
+    index = TimeIndex(timestamps)
+    tau = 5
+    distance = np.abs(timestamps[:, None] - timestamps[None, :])
+    close = (distance <= tau) & ~np.eye(len(timestamps), dtype=bool)
+    assert np.array_equal(index.neighbours(tau), close.sum(axis=1))
+    first, second = index.pairs(tau)
+    assert len(first) == close.sum() // 2 and np.all(np.abs(timestamps[first] - timestamps[second]) <= tau)
+    pileup = accepted(index.flags(tau), Timing.PILEUP)
+    assert np.array_equal(~pileup, close.any(axis=1))
+    covered = np.zeros(10_000 + 100, dtype=bool)
+    for t in timestamps:
+        covered[t:t + 100] = True
+    assert index.dead_time(100) == covered.sum()
+    L.info(f"{len(first)} pairs within {tau}, {np.count_nonzero(~pileup)} piled-up events: all checks passed.")
+
+
+__all__ = ["Timing", "TimeIndex", "flags", "accepted"]
+
+
+if __name__ == "__main__":
+    test()
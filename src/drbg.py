@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Espansione dell'entropia del TRNG tramite un generatore deterministico crittografico (DRBG)."""
+from __future__ import annotations
+from hashlib import sha256
+import hmac
+import time
+import numpy as np
+from log import getLogger
+from rand import TrueRandomGenerator
+
+
+L = getLogger(__name__)  # Il logger associato a questo modulo
+
+# Numero massimo di byte per singola richiesta all'HMAC-DRBG (2**19 bit, come da NIST SP 800-90A)
+MAX_REQUEST: int = 1 << 16
+
+
+class HmacDRBG:
+    """Un HMAC-DRBG con SHA-256, come descritto in NIST SP 800-90A (sezione 10.1.2)."""
+
+    # --- Variabili d'istanza ---
+    # pubbliche
+    reseed_counter: int  # Numero di richieste dall'ultimo (ri)seme
+    # protette
+    _K:             bytes  # Chiave
+    _V:             bytes  # Valore
+
+    def __init__(self, entropy: bytes, nonce: bytes = b"", personalization: bytes = b"") -> None:
+        self._K = b"\x00" * 32
+        self._V = b"\x01" * 32
+        self._update(entropy + nonce + personalization)
+        self.reseed_counter = 1
+
+    # Metodo: aggiorna lo stato interno (chiave e valore) con i dati forniti
+    def _update(self, data: bytes = b"") -> None:
+        self._K = hmac.digest(self._K, self._V + b"\x00" + data, sha256)
+        self._V = hmac.digest(self._K, self._V, sha256)
+        if data:
+            self._K = hmac.digest(self._K, self._V + b"\x01" + data, sha256)
+            self._V = hmac.digest(self._K, self._V, sha256)
+
+    def reseed(self, entropy: bytes, additional: bytes = b"") -> None:
+        """Rimescola nello stato interno nuova entropia."""
+        self._update(entropy + additional)
+        self.reseed_counter = 1
+
+    def generate(self, n: int, additional: bytes = b"") -> bytes:
+        """Genera `n` byte pseudocasuali (al massimo `MAX_REQUEST` per volta)."""
+        if n > MAX_REQUEST:
+            raise ValueError(f"Cannot generate more than {MAX_REQUEST} bytes per request (requested {n}).")
+        if additional:
+            self._update(additional)
+        out: list[bytes] = []
+        for _ in range((n + 31) // 32):
+            self._V = hmac.digest(self._K, self._V, sha256)
+            out.append(self._V)
+        self._update(additional)
+        self.reseed_counter += 1
+        return b"".join(out)[:n]
+
+
+class ExpandedRandomGenerator:
+    """Un generatore veloce, con seme (e riseme periodico) preso dal TRNG.
+
+    Ogni `seed_bytes` byte veramente casuali vengono prodotti al massimo `reseed_interval` byte;
+    dopodiché, il DRBG viene rimescolato con nuovi byte del TRNG.
+    Per grandi quantità di dati, l'output dell'HMAC-DRBG fa da seme a un `BitGenerator` di NumPy (PCG64).
+    """
+
+    # --- Variabili d'istanza ---
+    # pubbliche
+    trng:             TrueRandomGenerator  # La sorgente di entropia
+    seed_bytes:       int                  # Byte veri usati per ogni (ri)seme
+    reseed_interval:  int                  # Byte prodotti tra un riseme e il successivo
+    entropy_consumed: int                  # Byte veri consumati finora
+    bytes_generated:  int                  # Byte prodotti finora
+    # protette
+    _drbg:            HmacDRBG             # Il generatore deterministico
+    _since_reseed:    int                  # Byte prodotti dall'ultimo riseme
+    _warned:          bool                 # Se l'esaurimento del TRNG è già stato segnalato
+
+    def __init__(
+        self,
+        trng: TrueRandomGenerator | None = None, /, *,
+        seed_bytes: int = 32,
+        reseed_interval: int = 1 << 20,
+        **kwargs,
+    ) -> None:
+        # Se il TRNG non è stato specificato, creane uno con i parametri dati
+        self.trng = TrueRandomGenerator(**kwargs) if trng is None else trng
+        self.seed_bytes = seed_bytes
+        self.reseed_interval = reseed_interval
+        self.entropy_consumed = 0
+        self.bytes_generated = 0
+        self._warned = False
+        # Il "nonce" richiesto dallo standard è preso anch'esso dal TRNG
+        self._drbg = HmacDRBG(self._true_bytes(seed_bytes), nonce=self._true_bytes(seed_bytes // 2))
+        self._since_reseed = 0
+
+    @property
+    def expansion(self) -> float:
+        """Rapporto tra i byte prodotti e i byte veramente casuali consumati."""
+        return self.bytes_generated / self.entropy_consumed
+
+    # Metodo: legge `n` byte dal TRNG, tenendo traccia dell'entropia consumata
+    def _true_bytes(self, n: int) -> bytes:
+        self.entropy_consumed += n
+        if self.entropy_consumed > self.trng.n_random_numbers and not self._warned:
+            L.warning("The TRNG has been exhausted: its bytes are now being reused.")
+            self._warned = True
+        return self.trng.random_bytes(n)
+
+    def reseed(self) -> None:
+        """Rimescola il DRBG con `seed_bytes` nuovi byte del TRNG."""
+        self._drbg.reseed(self._true_bytes(self.seed_bytes))
+        self._since_reseed = 0
+
+    # Metodo: quanti byte si possono ancora produrre (al massimo `n`), rimescolando se necessario
+    def _budget(self, n: int) -> int:
+        if self._since_reseed >= self.reseed_interval:
+            self.reseed()
+        n = min(n, self.reseed_interval - self._since_reseed)
+        self._since_reseed += n
+        self.bytes_generated += n
+        return n
+
+    def random_bytes(self, n: int) -> bytes:
+        """Restituisce `n` byte prodotti direttamente dall'HMAC-DRBG."""
+        chunks: list[bytes] = []
+        while n > 0:
+            size = self._budget(min(n, MAX_REQUEST))
+            chunks.append(self._drbg.generate(size))
+            n -= size
+        return b"".join(chunks)
+
+    def random_number(self) -> int:
+        """Restituisce un numero casuale da 0 a 255 (come `TrueRandomGenerator.random_number()`)."""
+        return self.random_bytes(1)[0]
+
+    def random_array(self, n: int) -> np.ndarray:
+        """Restituisce `n` byte come array di NumPy, con un nuovo PCG64 per ogni intervallo di riseme."""
+        out = np.empty(n, dtype=np.uint8)
+        i = 0
+        while i < n:
+            size = self._budget(n - i)
+            bg = np.random.PCG64(int.from_bytes(self._drbg.generate(32), "big"))
+            out[i:i + size] = bg.random_raw((size + 7) // 8).view(np.uint8)[:size]
+            i += size
+        return out
+
+    def bit_generator(self) -> np.random.BitGenerator:
+        """Un `BitGenerator` di NumPy con seme appena ricavato da nuova entropia del TRNG.
+
+        L'output del `BitGenerator` non viene conteggiato: per rispettare `reseed_interval`,
+        usare `random_array()` o richiederne uno nuovo al bisogno.
+        """
+        self.reseed()
+        self._since_reseed = self.reseed_interval  # Il prossimo utilizzo richiederà un nuovo riseme
+        return np.random.PCG64(int.from_bytes(self._drbg.generate(32), "big"))
+
+    def generator(self) -> np.random.Generator:
+        """Un `numpy.random.Generator` con seme appena ricavato da nuova entropia del TRNG."""
+        return np.random.Generator(self.bit_generator())
+
+
+def test():
+    """Misura la velocità del generatore."""
+    gen = ExpandedRandomGenerator()
+    for name, func, n in [
+        ("HMAC-DRBG", gen.random_bytes, 1 << 22),
+        ("PCG64", gen.random_array, 1 << 28),
+    ]:
+        with L.task(f"Generating {n} bytes ({name})") as generating:
+            t = time.perf_counter()
+            func(n)
+            t = time.perf_counter() - t
+            generating.result = f"{n / t / 2**20:.1f} MiB/s"
+    L.info(f"Expansion: {gen.expansion:.0f} bytes per true random byte")
+
+
+# Chiama "test()" quando il programma viene eseguito direttamente
+if __name__ == "__main__":
+    test()
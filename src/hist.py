@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Istogrammi e statistiche vettoriali (con NumPy), accumulabili un blocco di dati alla volta."""
+from __future__ import annotations
+from typing import Any, Iterable
+from pathlib import Path
+import numpy as np
+
+
+def counts(data: Iterable[int] | np.ndarray, n: int) -> np.ndarray:
+    """Conta quante volte compare ciascun intero in [0, n) nel vettore `data`.
+
+    Esempio
+    -------
+    >>> counts([0, 1, 1, 3], 5).tolist()
+    [1, 2, 0, 1, 0]
+    """
+    return np.bincount(np.asarray(data, dtype=np.intp), minlength=n)
+
+
+def cyclic_local_means(data: Iterable[float] | np.ndarray, spread: int = 5) -> np.ndarray:
+    """Calcola ciclicamente le medie locali del vettore `data`, con lo `spread` specificato, in O(n).
+
+    Utilizza le somme cumulative (esatte per dati interi) invece di sommare ogni finestra.
+
+    Esempio
+    -------
+    >>> cyclic_local_means(range(6), spread=4).tolist()
+    [2.0, 1.5, 2.5, 3.5, 3.0, 2.5]
+    """
+    data = np.asarray(data)
+    if data.dtype.kind not in "iub":
+        data = data.astype(np.float64)
+    length = len(data)
+    if not length:
+        # Nessun dato, nessuna media (come nella versione originale)
+        return np.zeros(0)
+    left = (spread - 1) // 2
+    # Una finestra di `spread` elementi contiene `q` volte tutto il vettore, più `r` elementi
+    q, r = divmod(spread, length)
+    # prefix[k] = somma dei primi `k` elementi di `data` ripetuto due volte
+    prefix = np.concatenate([[0], np.cumsum(np.concatenate([data, data]))])
+    start = (np.arange(length) - left) % length
+    return (q * prefix[length] + prefix[start + r] - prefix[start]) / spread
+
+
+class Histogram:
+    """Un istogramma con binning fisso, riempibile un blocco di dati alla volta e sommabile ad altri.
+
+    Come in `numpy.histogram`, tutti gli intervalli sono semiaperti a destra, eccetto l'ultimo;
+    i valori al di fuori vengono contati in `underflow` e `overflow`.
+    Può essere salvato su file (`save()` e `load()`) o convertito in un dizionario (`to_dict()` e `from_dict()`).
+
+    Esempio
+    -------
+    >>> h = Histogram.linear(0, 4, 4)
+    >>> h.fill([0, 1, 1, 4]).fill([-1, 2.5, 7]).counts.tolist()
+    [1, 2, 1, 1]
+    >>> h.underflow, h.overflow
+    (1, 1)
+    """
+
+    # --- Variabili d'istanza ---
+    edges:     np.ndarray  # Estremi degli intervalli (`n + 1` valori crescenti)
+    counts:    np.ndarray  # Conteggi (`n` valori)
+    underflow: int         # Valori minori del primo estremo
+    overflow:  int         # Valori maggiori dell'ultimo estremo
+
+    def __init__(self, edges: Iterable[float] | np.ndarray) -> None:
+        self.edges = np.asarray(edges, dtype=np.float64)
+        if self.edges.ndim != 1 or len(self.edges) < 2 or np.any(np.diff(self.edges) <= 0):
+            raise ValueError("Histogram edges must be a strictly increasing sequence of at least 2 values.")
+        self.counts = np.zeros(len(self.edges) - 1, dtype=np.int64)
+        self.underflow = 0
+        self.overflow = 0
+
+    @classmethod
+    def linear(cls, lo: float, hi: float, bins: int) -> Histogram:
+        """Istogramma con `bins` intervalli di uguale larghezza tra `lo` e `hi`."""
+        return cls(np.linspace(lo, hi, bins + 1))
+
+    @classmethod
+    def log(cls, lo: float, hi: float, bins: int) -> Histogram:
+        """Istogramma con `bins` intervalli di uguale larghezza in scala logaritmica tra `lo` e `hi`."""
+        return cls(np.geomspace(lo, hi, bins + 1))
+
+    @property
+    def bins(self) -> int:
+        """Il numero di intervalli."""
+        return len(self.counts)
+
+    @property
+    def centers(self) -> np.ndarray:
+        """I centri degli intervalli."""
+        return (self.edges[1:] + self.edges[:-1]) / 2
+
+    @property
+    def widths(self) -> np.ndarray:
+        """Le larghezze degli intervalli."""
+        return np.diff(self.edges)
+
+    def fill(self, values: Iterable[float] | np.ndarray) -> Histogram:
+        """Aggiunge i valori `values` all'istogramma (e lo restituisce, per comodità)."""
+        values = np.asarray(values).ravel()
+        index = np.searchsorted(self.edges, values, side="right") - 1
+        # L'ultimo intervallo è chiuso a destra
+        index[values == self.edges[-1]] = self.bins - 1
+        under = index < 0
+        over = index >= self.bins
+        self.underflow += int(np.count_nonzero(under))
+        self.overflow += int(np.count_nonzero(over))
+        self.counts += np.bincount(index[~(under | over)], minlength=self.bins)
+        return self
+
+    def _check(self, other: Histogram) -> None:
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Cannot combine histograms with different binning.")
+
+    def __iadd__(self, other: Histogram) -> Histogram:
+        """Somma `other` a questo istogramma."""
+        if not isinstance(other, Histogram):
+            return NotImplemented
+        self._check(other)
+        self.counts += other.counts
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+        return self
+
+    def __add__(self, other: Histogram) -> Histogram:
+        """Somma di due istogrammi con lo stesso binning."""
+        if not isinstance(other, Histogram):
+            return NotImplemented
+        result = self.copy()
+        result += other
+        return result
+
+    def copy(self) -> Histogram:
+        """Crea una copia di questo istogramma."""
+        result = type(self)(self.edges)
+        result.counts = self.counts.copy()
+        result.underflow = self.underflow
+        result.overflow = self.overflow
+        return result
+
+    @property
+    def entries(self) -> int:
+        """Il numero totale di valori inseriti (compresi quelli al di fuori degli intervalli)."""
+        return int(self.counts.sum()) + self.underflow + self.overflow
+
+    def to_dict(self) -> dict[str, Any]:
+        """Converte l'istogramma in un dizionario (serializzabile, ad esempio, in JSON)."""
+        return dict(
+            edges=self.edges.tolist(),
+            counts=self.counts.tolist(),
+            underflow=self.underflow,
+            overflow=self.overflow,
+        )
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> Histogram:
+        """Ricostruisce l'istogramma a partire dal dizionario prodotto da `to_dict()`."""
+        result = cls(data["edges"])
+        counts = np.asarray(data["counts"], dtype=np.int64)
+        if counts.shape != result.counts.shape:
+            raise ValueError(f"Expected {result.bins} counts, got {len(counts)}.")
+        result.counts = counts
+        result.underflow = int(data["underflow"])
+        result.overflow = int(data["overflow"])
+        return result
+
+    def save(self, path: Path | str) -> None:
+        """Salva l'istogramma nel file (NumPy, `.npz`) `path`."""
+        np.savez(path, **{key: np.asarray(value) for key, value in self.to_dict().items()})
+
+    @classmethod
+    def load(cls, path: Path | str) -> Histogram:
+        """Carica un istogramma salvato con `save()`."""
+        with np.load(path) as data:
+            return cls.from_dict({key: data[key] for key in data.files})
+
+    def __repr__(self) -> str:
+        """Rappresentazione dell'oggetto come stringa."""
+        return (
+            f"<{type(self).__name__} {self.bins} bins in [{self.edges[0]:g}, {self.edges[-1]:g}], "
+            f"{int(self.counts.sum())} entries>"
+        )
+
+
+__all__ = ["counts", "cyclic_local_means", "Histogram"]
@@ -2,13 +2,20 @@ import cython
 
 
 @cython.locals(
-    TOT=cython.ulonglong,
     K=cython.ulonglong,
     N_in=cython.ulonglong,
-    N_out=cython.ulonglong,
-    X=cython.ulonglong,
+    N_on=cython.ulonglong,
+    x=cython.ulonglong,
+    T=cython.ulonglong,
     Y=cython.ulonglong,
-    v=cython.ulonglong,
+)
+cpdef tuple counts(unsigned long long N)
+
+
+@cython.locals(
+    TOT=cython.ulonglong,
+    N_in=cython.ulonglong,
+    N_out=cython.ulonglong,
 )
 cpdef double grid(unsigned long long N)
 
@@ -2,29 +2,50 @@
 # -*- coding: utf-8 -*-
 """Ciò che succederebbe con un dataset ideale."""
 from __future__ import annotations
-import sys
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from itertools import count, islice, takewhile
+from math import isqrt
+from pathlib import Path
+import argparse
+import signal
+import csv
+import os
+import numpy as np
+from log import getLogger
 # from math import pi as PI
 # import matplotlib.pyplot as plt
 
 
+L = getLogger(__name__)  # Il logger associato a questo modulo
+
+# Numero di righe elaborate insieme da `counts_batch()` (e somma massima dei lati di un batch di `sweep()`)
+BATCH = 1 << 22
+# Intestazione del file dei risultati
+HEADER = ["N", "pim", "piM", "pi"]
+
+
+def counts(N):
+    """Conta i punti di una griglia di lato `N` all'interno e all'esterno del cerchio di raggio `N - 1`.
+
+    I punti sulla circonferenza vengono contati in entrambi i casi.
+    Per ogni riga X basta trovare l'ultima colonna all'interno, ⌊√(K - X²)⌋: O(N) invece di O(N²).
+    """
+    K = (N - 1) ** 2
+    N_in = 0
+    N_on = 0
+    for x in range(N):
+        T = K - x * x
+        Y = isqrt(T)
+        N_in += Y + 1  # Le colonne da 0 a Y
+        N_on += Y * Y == T
+    return N_in, N * N - N_in + N_on
+
+
 def grid(N):
     """Calcola π sia per eccesso e per difetto su una griglia di lato `N`."""
     TOT = N**2
-    squares = [x**2 for x in range(N)]
-    # K = (N - 1) ** 2
-    K = squares[-1]  # l'ultimo valore di `squares` è in effetti K
-    N_in = 0
-    N_out = 0
-    for X in squares:
-        for Y in squares:
-            v = X + Y - K
-            if v == 0:
-                N_in += 1
-                N_out += 1
-            elif v < 0:
-                N_in += 1
-            else:
-                N_out += 1
+    N_in, N_out = counts(N)
     pim = N_in * 4 / TOT
     piM = (TOT - N_out) * 4 / TOT
     pi = (pim + piM) / 2
@@ -32,6 +53,159 @@ def grid(N):
     return pi
 
 
+def _isqrt(T):
+    """Radice quadrata intera di ciascun elemento di `T` (interi non negativi, minori di 2⁶³)."""
+    Y = np.sqrt(T.astype(np.float64)).astype(np.int64)
+    # La radice in virgola mobile può sbagliare di un'unità per valori grandi: correggila
+    Y -= Y * Y > T
+    Y += (Y + 1) * (Y + 1) <= T
+    return Y
+
+
+def counts_batch(Ns):
+    """Come `counts()`, ma per più lati `Ns` contemporaneamente (con NumPy).
+
+    Le righe di tutte le griglie vengono elaborate `BATCH` alla volta: la memoria occupata non dipende dai lati.
+    """
+    Ns = np.asarray(Ns, dtype=np.int64)
+    if np.any(Ns < 1):
+        raise ValueError("Grid sizes must be positive.")
+    ends = np.cumsum(Ns)
+    starts = ends - Ns
+    N_in = np.zeros(len(Ns), dtype=np.int64)
+    N_on = np.zeros(len(Ns), dtype=np.int64)
+    total = int(ends[-1]) if len(Ns) else 0  # (nessun lato: nessuna riga)
+    for first in range(0, total, BATCH):
+        rows = np.arange(first, min(first + BATCH, total), dtype=np.int64)
+        # Griglia a cui appartiene ciascuna riga, e indice `x` della riga al suo interno
+        owner = np.searchsorted(ends, rows, side="right")
+        x = rows - starts[owner]
+        T = (Ns[owner] - 1) ** 2 - x * x
+        Y = _isqrt(T)
+        # Somma i conteggi per ciascuna griglia (le righe della stessa griglia sono contigue)
+        new = np.flatnonzero(np.concatenate([[True], owner[1:] != owner[:-1]]))
+        N_in[owner[new]] += np.add.reduceat(Y + 1, new)
+        N_on[owner[new]] += np.add.reduceat((Y * Y == T).astype(np.int64), new)
+    return N_in, Ns * Ns - N_in + N_on
+
+
+def grid_batch(Ns):
+    """Come `grid()`, ma per più lati `Ns` contemporaneamente (senza stampare nulla).
+
+    Restituisce `pim`, `piM` e `pi`.
+    """
+    Ns = np.asarray(Ns, dtype=np.int64)
+    TOT = Ns * Ns
+    N_in, N_out = counts_batch(Ns)
+    pim = N_in * 4 / TOT
+    piM = (TOT - N_out) * 4 / TOT
+    return pim, piM, (pim + piM) / 2
+
+
+def linear(start=1, stop=None, step=1):
+    """I lati da `start` a `stop` (compreso; di default, all'infinito), con passo `step`."""
+    Ns = count(start, step)
+    return Ns if stop is None else takewhile(lambda N: N <= stop, Ns)
+
+
+def logarithmic(start=1, stop=None, per_decade=100):
+    """I lati da `start` a `stop` (compreso; di default, all'infinito), `per_decade` per ogni decade.
+
+    I lati sono arrotondati all'intero più vicino, ed eventuali duplicati vengono scartati.
+    """
+    last = 0
+    for i in count():
+        N = round(start * 10 ** (i / per_decade))
+        if stop is not None and N > stop:
+            return
+        if N > last:
+            yield N
+            last = N
+
+
+def _batches(Ns):
+    """Raggruppa i lati (consecutivi) in batch, con somma al massimo `BATCH` (ma almeno un lato per batch)."""
+    batch = []
+    size = 0
+    for N in Ns:
+        if batch and size + N > BATCH:
+            yield batch
+            batch = []
+            size = 0
+        batch.append(N)
+        size += N
+    if batch:
+        yield batch
+
+
+def _task(Ns):
+    """Calcola un batch di lati (in un processo separato)."""
+    return Ns, *(values.tolist() for values in grid_batch(Ns))
+
+
+def resume(path):
+    """L'ultimo lato completato nel file dei risultati `path` (0 se non ce n'è nessuno).
+
+    Un'eventuale ultima riga incompleta (ad esempio, per un'interruzione durante la scrittura) viene rimossa.
+    """
+    if not path.exists():
+        return 0
+    with path.open("rb+") as f:
+        data = f.read()
+        # Tronca il file dopo l'ultima riga completa
+        end = data.rfind(b"\n") + 1
+        f.truncate(end)
+    rows = data[:end].decode().splitlines()
+    if len(rows) < 2:
+        return 0
+    return int(rows[-1].split(",")[0])
+
+
+def sweep(Ns, path=None, jobs=None):
+    """Calcola `grid()` per tutti i lati `Ns` (crescenti), in parallelo su `jobs` processi (di default, uno per CPU).
+
+    I risultati vengono stampati e, se `path` è specificato, aggiunti in ordine al file CSV `path`,
+    un batch alla volta: se il file esiste già, si riprende dal primo lato non ancora calcolato.
+    """
+    done = 0
+    if path is not None:
+        done = resume(path)
+        if done:
+            L.info(f"Resuming after N = {done}.")
+        Ns = (N for N in Ns if N > done)
+    out = None
+    writer = None
+    if path is not None:
+        new = not path.exists() or path.stat().st_size == 0
+        out = path.open("a", newline="")
+        writer = csv.writer(out)
+        if new:
+            writer.writerow(HEADER)
+    executor = ProcessPoolExecutor(jobs, initializer=signal.signal, initargs=(signal.SIGINT, signal.SIG_IGN))
+    # Al massimo due batch in coda per processo: i risultati vengono scritti nell'ordine dei lati
+    window = 2 * (jobs or os.cpu_count() or 1)
+    batches = _batches(Ns)
+    pending = deque(executor.submit(_task, batch) for batch in islice(batches, window))
+    try:
+        while pending:
+            batch, pim, piM, pi = pending.popleft().result()
+            pending.extend(executor.submit(_task, batch) for batch in islice(batches, 1))
+            for row in zip(batch, pim, piM, pi):
+                print(f"{row[0]}\t{row[1]:01.15f}\t{row[2]:01.15f}\t{row[3]:01.15f}")
+            if writer is not None:
+                writer.writerows(zip(batch, pim, piM, pi))
+                out.flush()
+            done = batch[-1]
+    except KeyboardInterrupt:
+        L.info(f"Interrupted: completed up to N = {done}.")
+    finally:
+        # I processi ignorano Ctrl+C: i batch in corso vengono scartati
+        executor.shutdown(wait=False, cancel_futures=True)
+        if out is not None:
+            out.close()
+    return done
+
+
 # def theoretical(N, case):
 #     TOT = N**2
 #     N_in = int(PI * TOT / 4)
@@ -45,13 +219,27 @@ def grid(N):
 
 def main():
     """Main program."""
-    N = 1
-    while True:
-        try:
-            grid(N)
-            N += 1
-        except KeyboardInterrupt:
-            sys.exit(0)
+    parser = argparse.ArgumentParser(description="Estimate π by counting the points of an N×N grid.")
+    parser.add_argument("--start", type=int, default=1, help="first grid size (default: 1)")
+    parser.add_argument("--stop", type=int, help="last grid size (default: never stop)")
+    spacing = parser.add_mutually_exclusive_group()
+    spacing.add_argument("--step", type=int, default=1, help="step between grid sizes (default: 1)")
+    spacing.add_argument("--log", type=int, metavar="PER_DECADE", help="log-spaced grid sizes, PER_DECADE per decade")
+    parser.add_argument("--jobs", type=int, help="number of processes (default: one per CPU)")
+    parser.add_argument("--output", type=Path, help="CSV file to append results to (and resume from)")
+    args = parser.parse_args()
+    # (con valori minori di 1 la sequenza dei lati non avanzerebbe mai)
+    if args.start < 1:
+        parser.error("--start must be at least 1")
+    if args.step < 1:
+        parser.error("--step must be at least 1")
+    if args.log is not None and args.log < 1:
+        parser.error("--log must be at least 1")
+    if args.log is not None:
+        Ns = logarithmic(args.start, args.stop, args.log)
+    else:
+        Ns = linear(args.start, args.stop, args.step)
+    sweep(Ns, args.output, args.jobs or None)
     # theoretical(N, case)
     # diff = []
     # for i in range(500):
@@ -1,10 +1,45 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
+from typing import Iterable, Iterator
+from pathlib import Path
+import numpy as np
+
+
+BATCH: int
+HEADER: list[str]
+
+
+def counts(N: int) -> tuple[int, int]:
+    ...
 
 
 def grid(N: int) -> float:
     ...
 
 
+def counts_batch(Ns: Iterable[int] | np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    ...
+
+
+def grid_batch(Ns: Iterable[int] | np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    ...
+
+
+def linear(start: int = 1, stop: int | None = None, step: int = 1) -> Iterator[int]:
+    ...
+
+
+def logarithmic(start: int = 1, stop: int | None = None, per_decade: int = 100) -> Iterator[int]:
+    ...
+
+
+def resume(path: Path) -> int:
+    ...
+
+
+def sweep(Ns: Iterable[int], path: Path | None = None, jobs: int | None = None) -> int:
+    ...
+
+
 def main() -> None:
     ...
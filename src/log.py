@@ -2,12 +2,20 @@
 # -*- coding : utf-8 -*-
 """Utility module: logging support."""
 from __future__ import annotations
-from typing import Any, Iterator, cast
+from typing import Any, Callable, Iterator, cast
+from types import CodeType
 from logging import NOTSET, DEBUG, INFO, WARNING, ERROR, CRITICAL
 from contextlib import contextmanager, _GeneratorContextManager
 from io import StringIO
+from functools import lru_cache
+import logging.handlers
+import threading
+import copy
 import logging
+import atexit
+import queue
 import inspect
+import shutil
 import time
 import os
 import sys
@@ -28,14 +36,20 @@ except ModuleNotFoundError:
 else:
     RICH = True
 
+# Opt-in asynchronous logging: records are written to the terminal by a background thread
+ASYNC = bool(eval(os.environ.get("ASYNC_LOGGING", "") or "0"))
+# Maximum number of records waiting to be written...
+QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "") or 10_000)
+# ... and what to do when there are more: "drop" them (never wait) or "block" the logging thread
+QUEUE_POLICY = os.environ.get("LOG_QUEUE_POLICY", "") or "drop"
 
 __all__ = [
     # Exported from `logging`
     "NOTSET", "DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL",
     # Defined here
     "TIMESTAMP", "DEFAULT_LEVEL", "ICONS", "STYLES",
-    "ConsoleFormatter", "Logger",
-    "cli_configure", "getLogger",
+    "ConsoleFormatter", "Lazy", "Logger", "AsyncHandler",
+    "cli_configure", "getLogger", "flush",
     "debug", "info", "warning", "error", "critical", "exception", "task",
 ]
 
@@ -62,6 +76,20 @@ def sprint(*values, sep: str = " ", end: str = "\n", style: str = ""):
         print(*values, sep=sep, end=end, flush=True)
 
 
+# Fast access to the caller's frame (CPython only)
+_getframe = getattr(sys, "_getframe", None)
+# The logger of the module each code object (function, module body...) belongs to
+_CODE_LOGGERS: dict[CodeType, Logger] = {}
+# The lowest level explicitly set on any `Logger` (see `Logger.setLevel()`)
+_lowest_level: int = CRITICAL + 1
+_root: logging.Logger = logging.root
+
+
+def _filtered(level: int) -> bool:
+    """Check (without looking up any logger) whether messages at `level` would be dropped by every logger."""
+    return (level < _root.level and level < _lowest_level) or level <= _root.manager.disable
+
+
 def getLogger(name: str | None = None, /, *, depth: int = 0) -> Logger:
     """Get the logger associated with this given name.
 
@@ -70,11 +98,16 @@ def getLogger(name: str | None = None, /, *, depth: int = 0) -> Logger:
     """
     if not name:
         try:
-            return getLogger(
-                inspect.stack()[1 + depth].frame.f_globals["__name__"]
-                if name is None else name
-            )
-        except IndexError:
+            if _getframe is None:
+                # Slow path, for interpreters without `sys._getframe()`
+                return getLogger(inspect.stack()[1 + depth].frame.f_globals["__name__"])
+            # Fast path: only look at the caller's frame, and remember the result for its code object
+            frame = _getframe(1 + depth)
+            logger = _CODE_LOGGERS.get(frame.f_code)
+            if logger is None:
+                logger = _CODE_LOGGERS[frame.f_code] = getLogger(frame.f_globals["__name__"])
+            return logger
+        except (IndexError, ValueError):
             getLogger(__name__).critical(
                 "Could not resolve `__name__` from an outer frame.\n"
                 "There may be a problem with the interpreter frame stack, "
@@ -133,14 +166,96 @@ TASK_MESSAGE = style("--> {}", "bold")
 
 _setup_done: bool = False
 
+# How often (in seconds) the terminal width is checked again
+WIDTH_REFRESH: float = 1.0
+
+
+class Lazy:
+    """A log message that is only built (once) if it is actually emitted.
+
+    Either `Lazy(function)`, which calls `function()`, or `Lazy(fmt, *args, **kwargs)`,
+    which calls `fmt.format(*args, **kwargs)`. Pass it as the message (`L.debug(Lazy(...))`):
+    other callables are logged as they are, not called.
+
+    >>> Lazy("{} + {x}", 1, x=2), Lazy(lambda: "expensive")
+    (1 + 2, expensive)
+    """
+
+    __slots__ = ("_function", "_args", "_kwargs", "_text")
+    _function: Callable[..., Any]
+    _args: tuple[Any, ...]
+    _kwargs: dict[str, Any]
+    _text: str | None
+
+    def __init__(self, function: Callable[..., Any] | str, /, *args: Any, **kwargs: Any) -> None:
+        self._function = function.format if isinstance(function, str) else function
+        self._args = args
+        self._kwargs = kwargs
+        self._text = None
+
+    def __str__(self) -> str:
+        if self._text is None:
+            self._text = str(self._function(*self._args, **self._kwargs))
+        return self._text
+
+    __repr__ = __str__
+
+
+@lru_cache(maxsize=1024)
+def _markup_len(text: str) -> int:
+    """The number of characters of `text` that are `rich` markup (tags and escapes), and are not displayed.
+
+    Same result as `len(text) - len(rich.markup.render(text))`, without building any `Text` (emoji codes aside).
+    """
+    if "[" not in text:
+        return 0
+    hidden = 0
+    position = 0
+    for match in rich.markup.RE_TAGS.finditer(text):
+        full, escapes, _ = match.groups()
+        # In plain text, `\[` is displayed as `[`
+        hidden += text.count("\\[", position, match.start())
+        position = match.end()
+        if escapes:
+            # Pairs of backslashes become a single one; an odd one escapes the tag, which is displayed as is
+            backslashes, escaped = divmod(len(escapes), 2)
+            hidden += backslashes
+            if escaped:
+                hidden += 1
+                continue
+        hidden += len(full) - len(escapes)
+    return hidden + text.count("\\[", position)
+
 
 class ConsoleFormatter(logging.Formatter):
     """A customized logging formatter."""
 
+    _width: int         # Terminal width, as of...
+    _width_time: float  # ... this time (see `WIDTH_REFRESH`)
+
     def __init__(self, lfmt: str, rfmt: str, *args, **kwargs) -> None:
         """Left and right formatter strings."""
         lfmt, rfmt = lfmt.replace("\0", ""), rfmt.replace("\0", "")
         super().__init__(lfmt + "\0" + rfmt, *args, **kwargs)
+        self._width = 80
+        self._width_time = float("-inf")
+
+    def width(self) -> int:
+        """The terminal width (80 if not a terminal), checked at most once every `WIDTH_REFRESH` seconds."""
+        now = time.monotonic()
+        if now - self._width_time > WIDTH_REFRESH:
+            self._width = shutil.get_terminal_size().columns
+            self._width_time = now
+        return self._width
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        """Format the message (already built by `format()`), indented."""
+        message = record.message
+        record.message = " " * getattr(record, "indent", 0) * 4 + message
+        try:
+            return super().formatMessage(record)
+        finally:
+            record.message = message
 
     def format(self, record: logging.LogRecord) -> str:
         """Correctly format `record`."""
@@ -155,21 +270,17 @@ class ConsoleFormatter(logging.Formatter):
         # Fix `took` missing
         if not hasattr(record, "took"):
             setattr(record, "took", "")
-        # Apply indent
-        if hasattr(record, "indent"):
-            record.msg = " " * getattr(record, "indent") * 4 + record.msg
-            delattr(record, "indent")
-        # Format and right-align text
+        # Format (the message is built here, with `record.getMessage()`, and indented by `formatMessage()`)
         text = super().format(record)
         if RICH:
             text = f"[{STYLES[record.levelno]}]{text}[/]"
-        styles_len = len(text) - len(rich.markup.render(text)) if RICH else 0
         left, right = text.split("\0")
         if right:
             # Right-align text only if needed
-            width = os.get_terminal_size().columns  # Terminal width
+            width = self.width()
             rows = left.split("\n")
             first = rows[0]
+            styles_len = _markup_len(first) + _markup_len(right) if RICH else 0
             if len(first) + 1 + len(right) - styles_len <= width:
                 # Don't add the right text if the left one is too long
                 first += f"{' '*(width - len(first) - len(right) + styles_len)}{right}"
@@ -197,6 +308,18 @@ class Logger(logging.Logger):
         self._result_logged = False
         self._timestamp = None
 
+    def setLevel(self, level: int | str) -> None:
+        """Set the logging level of this logger (keeping track of the lowest level in use)."""
+        global _lowest_level  # pylint: disable=global-statement
+        super().setLevel(level)
+        _lowest_level = min(
+            (
+                logger.level for logger in logging.root.manager.loggerDict.values()
+                if isinstance(logger, Logger) and logger.level != NOTSET
+            ),
+            default=CRITICAL + 1,
+        )
+
     def makeRecord(self, *args, **kwargs) -> logging.LogRecord:
         """Create a `logging.LogRecord` instance."""
         record = super().makeRecord(*args, **kwargs)
@@ -204,10 +327,10 @@ class Logger(logging.Logger):
         return record
 
     @contextmanager
-    def task(self, msg: str, level: int = INFO, id: str | None = None) -> Iterator[Logger]:
+    def task(self, msg: str | Lazy, level: int = INFO, id: str | None = None) -> Iterator[Logger]:
         """Log the fact we're doing something."""
         # pylint: disable=protected-access
-        self.log(level, TASK_MESSAGE.format(msg))  # pylint: disable=logging-format-interpolation
+        self.log(level, Lazy(TASK_MESSAGE, msg))
         tsk = self.getChild("task")
         if id:
             tsk = tsk.getChild(id)
@@ -260,6 +383,108 @@ class Logger(logging.Logger):
         self._result_logged = True
 
 
+class _Listener(logging.handlers.QueueListener):
+    """A `QueueListener` that can be stopped even when its (bounded) queue is full."""
+
+    def enqueue_sentinel(self) -> None:
+        """Wait for room in the queue, instead of failing."""
+        self.queue.put(self._sentinel)
+
+    def handle(self, record: logging.LogRecord) -> None:
+        """Handle a record, without letting an error stop the writer thread (and lose all the following records)."""
+        try:
+            super().handle(record)
+        except Exception:  # pylint: disable=broad-except
+            for handler in self.handlers:
+                handler.handleError(record)
+
+
+class AsyncHandler(logging.handlers.QueueHandler):
+    """A handler that hands records over to a background thread, which formats them and writes them with `handler`.
+
+    The queue is bounded (`size` records): when it is full, new records are either dropped and counted
+    (`policy="drop"`), so that logging never waits for the terminal, or the logging thread waits (`policy="block"`).
+    The message is built (with its arguments) before the record is queued, as in `QueueHandler`;
+    only the costly formatting and terminal output are left to the background thread.
+    The queue is flushed at exit and before a `fork()`. Forked processes (like the workers of a process pool,
+    which exit without running `atexit` functions) and records logged after `stop()` are written synchronously.
+    """
+
+    handler: logging.Handler
+    policy: str
+    dropped: int
+    _lock: threading.Lock
+    _listener: _Listener | None
+
+    def __init__(self, handler: logging.Handler, size: int = QUEUE_SIZE, policy: str = QUEUE_POLICY) -> None:
+        if policy not in ("drop", "block"):
+            raise ValueError(f"Unknown queue policy {policy!r}: must be 'drop' or 'block'.")
+        super().__init__(queue.Queue(size))
+        self.handler = handler
+        self.policy = policy
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._listener = None
+        self.start()
+        atexit.register(self.stop)
+        if hasattr(os, "register_at_fork"):
+            # The writer thread does not survive a `fork()`: let it finish (so that it holds no locks),
+            #   then write synchronously in the child
+            os.register_at_fork(before=self.flush, after_in_child=self._after_fork)
+
+    def start(self) -> None:
+        """Start the writer thread."""
+        self._listener = _Listener(self.queue, self.handler, respect_handler_level=True)
+        self._listener.start()
+
+    def _after_fork(self) -> None:
+        """Write synchronously from now on (in a forked child, which may never get to flush a queue)."""
+        self._listener = None
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Build the message now (arguments may change later), and leave the formatting to the writer thread."""
+        record = copy.copy(record)  # (other handlers may still need the original)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        """Queue the record, according to `policy` (or write it right away, without a writer thread)."""
+        if self._listener is None:
+            self.handler.handle(record)
+            return
+        if self.policy == "block":
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def flush(self) -> None:
+        """Wait until all queued records have been written."""
+        if self._listener is not None:
+            self.queue.join()  # type: ignore
+        self.handler.flush()
+
+    def stop(self) -> None:
+        """Write all queued records, and stop the writer thread."""
+        if self._listener is None:
+            return
+        # (the records logged from now on are written synchronously, while the writer thread empties the queue)
+        listener, self._listener = self._listener, None
+        listener.stop()
+        if self.dropped:
+            self.handler.handle(logging.makeLogRecord(dict(
+                name=__name__, levelno=WARNING, levelname=logging.getLevelName(WARNING),
+                msg=f"{self.dropped} log messages were dropped (queue full).",
+            )))
+        self.handler.flush()
+
+
 def get_levels() -> list[int]:
     """Get the installed levels, as a list, in severity ascending order."""
     name2level: dict[str, int] | None
@@ -273,8 +498,12 @@ def get_levels() -> list[int]:
     ))
 
 
-def cli_configure() -> None:
-    """Set up `logging` based on command-line flags."""
+def cli_configure(asynchronous: bool | None = None) -> None:
+    """Set up `logging` based on command-line flags.
+
+    With `asynchronous` (by default, if the `ASYNC_LOGGING` environment variable is set),
+    records are written by a background thread (see `AsyncHandler`).
+    """
     global _setup_done  # pylint: disable=global-statement
     if _setup_done:
         return
@@ -291,6 +520,7 @@ def cli_configure() -> None:
     level = levels[quietness]
     # Configurazione
     ch = rich.logging.RichHandler(
+        console=rich.console.Console(stderr=True),  # Keep standard output free for results
         highlighter=rich.highlighter.NullHighlighter(),
         show_level=False,
         show_time=False,
@@ -301,44 +531,56 @@ def cli_configure() -> None:
     ch.setLevel(NOTSET)
     logging.setLoggerClass(Logger)
     root = logging.getLogger()
-    root.addHandler(ch)
+    root.addHandler(AsyncHandler(ch) if (ASYNC if asynchronous is None else asynchronous) else ch)
     root.setLevel(level)
     _setup_done = True
 
 
-def task(msg: str, level: int = INFO, id: str | None = "") -> _GeneratorContextManager[Logger]:
+def flush() -> None:
+    """Wait until all log records have been written (only needed with asynchronous logging)."""
+    for handler in logging.getLogger().handlers:
+        handler.flush()
+
+
+def task(msg: str | Lazy, level: int = INFO, id: str | None = "") -> _GeneratorContextManager[Logger]:
     """Start logging a task."""
     return getLogger(depth=1).task(msg, level=level, id=id)
 
 
 def debug(msg: Any, *args: Any, extra: dict[str, Any] | None = None, **kwargs) -> None:
     """Log an debug message."""
-    getLogger(depth=1).debug(msg, *args, extra=extra, **kwargs)
+    if not _filtered(DEBUG):
+        getLogger(depth=1).debug(msg, *args, extra=extra, **kwargs)
 
 
 def info(msg: Any, *args: Any, extra: dict[str, Any] | None = None, **kwargs) -> None:
     """Log an information."""
-    getLogger(depth=1).info(msg, *args, extra=extra, **kwargs)
+    if not _filtered(INFO):
+        getLogger(depth=1).info(msg, *args, extra=extra, **kwargs)
 
 
 def warning(msg: Any, *args: Any, extra: dict[str, Any] | None = None, **kwargs) -> None:
     """Log a warning."""
-    getLogger(depth=1).warning(msg, *args, extra=extra, **kwargs)
+    if not _filtered(WARNING):
+        getLogger(depth=1).warning(msg, *args, extra=extra, **kwargs)
 
 
 def error(msg: Any, *args: Any, extra: dict[str, Any] | None = None, **kwargs) -> None:
     """Log an error."""
-    getLogger(depth=1).error(msg, *args, extra=extra, **kwargs)
+    if not _filtered(ERROR):
+        getLogger(depth=1).error(msg, *args, extra=extra, **kwargs)
 
 
 def critical(msg: Any, *args: Any, extra: dict[str, Any] | None = None, **kwargs) -> None:
     """Log an error that causes the program's termination."""
-    getLogger(depth=1).critical(msg, *args, extra=extra, **kwargs)
+    if not _filtered(CRITICAL):
+        getLogger(depth=1).critical(msg, *args, extra=extra, **kwargs)
 
 
 def exception(msg: Any, *args: Any, extra: dict[str, Any] | None = None, **kwargs) -> None:
     """Log an exception."""
-    getLogger(depth=1).exception(msg, *args, extra=extra, **kwargs)
+    if not _filtered(ERROR):
+        getLogger(depth=1).exception(msg, *args, extra=extra, **kwargs)
 
 
 if not eval(os.environ.get("NO_AUTO_LOGGING_CONFIG", "0") or "0"):
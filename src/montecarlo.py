@@ -0,0 +1,554 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Motore vettoriale (con NumPy) per la stima di π tramite il metodo Monte Carlo."""
+from __future__ import annotations
+from typing import Callable, Iterable, Iterator, NamedTuple
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+from math import isqrt
+import numpy as np
+
+
+# Raggio del cerchio al quadrato: i punti hanno coordinate intere da 0 a 255
+K = 255**2
+# THRESHOLD[x] è la massima `y` tale che il punto (x, y) sia all'interno del cerchio
+THRESHOLD = np.array([isqrt(K - x * x) for x in range(256)], dtype=np.intp)
+# INSIDE[x, y] indica se il punto (x, y) della griglia 256×256 è all'interno del cerchio
+INSIDE = (np.arange(256)[:, None] ** 2 + np.arange(256)[None, :] ** 2) <= K
+# Frazione dei punti della griglia all'interno del cerchio (è il valore atteso di π/4 per i metodi 0-5)
+P_INSIDE = float(INSIDE.mean())
+# Numero di punti per blocco nei calcoli in parallelo (e per batch all'interno di ciascun blocco)
+BLOCK: int = 1 << 22
+# Numero massimo di stime da conservare per disegnarne l'andamento
+MAX_TRACE: int = 10_000
+# Lato della griglia della densità dei punti (esatta per le coordinate intere da 0 a 255)
+GRID: int = 256
+
+
+class Result(NamedTuple):
+    """Il risultato di una stima di π."""
+
+    pi:      float              # Stima finale di π
+    n_in:    int                # Numero di punti all'interno del cerchio
+    n:       int                # Numero totale di punti
+    density: np.ndarray | None  # Punti per cella della griglia, [0] all'esterno e [1] all'interno (2×GRID×GRID)
+    trace:   np.ndarray         # Andamento (diluito) della stima di π...
+    steps:   np.ndarray         # ... e numero di punti (o di righe, per `all_pairs()`) a cui corrisponde
+    interval: tuple[float, float] | None = None  # Intervallo di confidenza sul valore atteso della stima (se calcolato)
+    vrf:      float | None = None  # Fattore di riduzione della varianza rispetto al metodo 0, a parità di punti
+    entropy:  int | None = None    # Numero di byte casuali utilizzati (se diverso da 2 per punto)
+
+
+class Partial(NamedTuple):
+    """Il risultato parziale di un blocco di punti, calcolato in parallelo."""
+
+    n_in:  int         # Numero di punti all'interno del cerchio
+    n:     int         # Numero totale di punti
+    steps: np.ndarray  # Numero di punti (dall'inizio del blocco) a cui sono stati presi i conteggi...
+    cum:   np.ndarray  # ... e numero di punti all'interno del cerchio fino a quel momento
+    density: np.ndarray  # Punti per cella della griglia (come `Result.density`)
+
+
+def _extreme(ids: np.ndarray, at: np.ndarray, values: np.ndarray, ufunc: np.ufunc) -> tuple[np.ndarray, np.ndarray]:
+    """Per ciascun gruppo di `ids` (non decrescenti), l'estremo di `values` (secondo `ufunc`) e la sua posizione."""
+    new = np.concatenate([[True], ids[1:] != ids[:-1]])
+    group = np.cumsum(new) - 1
+    ext = ufunc.reduceat(values, np.flatnonzero(new))
+    # Il primo valore di ciascun gruppo uguale all'estremo
+    hit = np.flatnonzero(values == ext[group])
+    hit = hit[np.concatenate([[True], group[hit][1:] != group[hit][:-1]])]
+    return at[hit], ext
+
+
+class Trace:
+    """L'andamento della stima di π, diluito in memoria limitata (con il metodo min/max).
+
+    Le stime sono raggruppate in intervalli di `width` punti consecutivi, e di ciascun intervallo
+    vengono conservate soltanto la minima e la massima (con la loro posizione): il grafico mantiene
+    così l'inviluppo delle fluttuazioni. Quando gli intervalli diventano più di `size`,
+    vengono uniti a due a due (e `width` raddoppia): la memoria occupata non dipende dal numero di punti.
+
+    Esempio
+    -------
+    >>> t = Trace(size=2)
+    >>> t.extend([3.0, 4.0, 2.0])
+    >>> t.extend([3.5, 3.0])
+    >>> t.width, t.points()
+    (4, (array([2, 3, 5]), array([4., 2., 3.])))
+    """
+
+    # --- Variabili d'istanza ---
+    # pubbliche
+    size:    int         # Numero massimo di intervalli
+    width:   int         # Numero di punti per intervallo (una potenza di 2)
+    n:       int         # Numero di stime viste finora
+    last:    float       # Ultima stima
+    # protette
+    _min_at: np.ndarray  # Posizione...
+    _min:    np.ndarray  # ... e valore della stima minima di ciascun intervallo
+    _max_at: np.ndarray  # Posizione...
+    _max:    np.ndarray  # ... e valore della stima massima di ciascun intervallo
+
+    def __init__(self, size: int = MAX_TRACE // 2) -> None:
+        self.size = size
+        self.width = 1
+        self.n = 0
+        self.last = float("nan")
+        self._min_at = self._max_at = np.empty(0, dtype=np.int64)
+        self._min = self._max = np.empty(0)
+
+    def extend(self, values: np.ndarray | list[float]) -> None:
+        """Aggiunge le stime `values`, corrispondenti ai punti successivi a quelli già visti."""
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return
+        at = np.arange(self.n + 1, self.n + len(values) + 1)
+        self.n += len(values)
+        self.last = float(values[-1])
+        ids = (at - 1) // self.width
+        min_at, min_v, max_at, max_v = at, values, at, values
+        if ids[0] < len(self._min):
+            # L'ultimo intervallo non è ancora completo: riprendilo
+            ids = np.concatenate([[ids[0]], ids])
+            min_at, min_v = np.concatenate([self._min_at[-1:], at]), np.concatenate([self._min[-1:], values])
+            max_at, max_v = np.concatenate([self._max_at[-1:], at]), np.concatenate([self._max[-1:], values])
+            self._min_at, self._min = self._min_at[:-1], self._min[:-1]
+            self._max_at, self._max = self._max_at[:-1], self._max[:-1]
+        self._append(ids, min_at, min_v, max_at, max_v)
+        while len(self._min) > self.size:
+            # Troppi intervalli: uniscili a due a due
+            self.width *= 2
+            ids = np.arange(len(self._min)) // 2
+            min_at, min_v, max_at, max_v = self._min_at, self._min, self._max_at, self._max
+            self._min_at = self._max_at = np.empty(0, dtype=np.int64)
+            self._min = self._max = np.empty(0)
+            self._append(ids, min_at, min_v, max_at, max_v)
+
+    # Metodo: aggiunge gli intervalli `ids`, riducendo ciascuno al suo minimo e al suo massimo
+    def _append(self, ids, min_at, min_v, max_at, max_v) -> None:
+        min_at, min_v = _extreme(ids, min_at, min_v, np.minimum)
+        max_at, max_v = _extreme(ids, max_at, max_v, np.maximum)
+        self._min_at = np.concatenate([self._min_at, min_at])
+        self._min = np.concatenate([self._min, min_v])
+        self._max_at = np.concatenate([self._max_at, max_at])
+        self._max = np.concatenate([self._max, max_v])
+
+    def points(self) -> tuple[np.ndarray, np.ndarray]:
+        """Le posizioni e i valori da disegnare (al massimo `2 · size + 1`), in ordine, compresa l'ultima stima."""
+        at = np.stack([self._min_at, self._max_at], axis=1)
+        values = np.stack([self._min, self._max], axis=1)
+        order = np.argsort(at, axis=1, kind="stable")
+        at = np.append(np.take_along_axis(at, order, axis=1).ravel(), self.n)
+        values = np.append(np.take_along_axis(values, order, axis=1).ravel(), self.last)
+        keep = np.concatenate([[True], at[1:] != at[:-1]])
+        return at[keep], values[keep]
+
+
+def _density(cx: np.ndarray, cy: np.ndarray, inside: np.ndarray) -> np.ndarray:
+    """Conta i punti in ciascuna cella (`cx`, `cy`) della griglia, separando quelli all'interno del cerchio."""
+    index = (inside.astype(np.intp) * GRID + cx) * GRID + cy
+    return np.bincount(index, minlength=2 * GRID * GRID).reshape(2, GRID, GRID)
+
+
+# --- Generazione delle coordinate ---
+
+def sequential(nums: list[int] | np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Interpreta i numeri come punti (x, y) sequenziali: (n0, n1), (n2, n3), ...
+
+    Un eventuale numero dispari finale viene ignorato.
+    """
+    nums = np.asarray(nums, dtype=np.int64)
+    end = len(nums) // 2 * 2
+    return nums[0:end:2], nums[1:end:2]
+
+
+def linked(nums: list[int] | np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Interpreta i numeri come punti (x, y) adiacenti: (n0, n1), (n1, n2), ..., (nN, n0)."""
+    nums = np.asarray(nums, dtype=np.int64)
+    return nums, np.roll(nums, -1)
+
+
+def pseudo(rng: np.random.Generator, n: int) -> tuple[np.ndarray, np.ndarray]:
+    """Genera `n` punti (x, y) pseudocasuali con il generatore `rng`."""
+    xy = rng.integers(0, 256, size=(2, n), dtype=np.int64)
+    return xy[0], xy[1]
+
+
+# --- Stima di π ---
+
+def estimate(x: np.ndarray, y: np.ndarray) -> Result:
+    """Stima π a partire dai punti (x, y), calcolando anche l'andamento della stima."""
+    return from_source(_array_source(x, y))
+
+
+def from_source(draw: Source, n: int | None = None) -> Result:
+    """Stima π con `n` punti presi dalla sorgente `draw` (di default, fino al suo esaurimento).
+
+    I punti vengono richiesti ed elaborati `BLOCK` alla volta: la memoria occupata non dipende da `n`.
+    """
+    def batches() -> Iterator[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        done = 0
+        while n is None or done < n:
+            x, y = draw(BLOCK if n is None else min(BLOCK, n - done))
+            if len(x) == 0:
+                break  # Sorgente esaurita
+            done += len(x)
+            yield x, y, x * x + y * y <= K
+
+    return _accumulate(batches())
+
+
+def _accumulate(batches: Iterable[tuple[np.ndarray, np.ndarray, np.ndarray]]) -> Result:
+    """Stima π dai batch di punti (cella x, cella y, se all'interno), conservando densità e andamento diluito."""
+    n_in = 0
+    n = 0
+    density = np.zeros((2, GRID, GRID), dtype=np.int64)
+    trace = Trace()
+    for cx, cy, inside in batches:
+        density += _density(cx, cy, inside)
+        # Numero di punti all'interno dopo ciascun punto: la stima è N_in · 4 / N
+        cum = np.cumsum(inside) + n_in
+        trace.extend(cum * 4 / np.arange(n + 1, n + len(cum) + 1))
+        n_in = int(cum[-1])
+        n += len(cum)
+    if not n:
+        raise ValueError("Cannot estimate π without any point.")
+    steps, values = trace.points()
+    return Result(n_in * 4 / n, n_in, n, density, values, steps)
+
+
+def all_pairs(nums: list[int] | np.ndarray) -> Result:
+    """Stima π usando tutte le possibili coppie (x, y) di numeri, in O(n + 256) invece che O(n²).
+
+    L'andamento della stima è calcolato riga per riga, cioè dopo aver combinato
+    ciascun numero (come `x`) con tutti gli altri (come `y`).
+    """
+    nums = np.asarray(nums, dtype=np.intp)
+    n = len(nums)
+    counts = np.bincount(nums, minlength=256)
+    # below[v] = quanti numeri sono ≤ v
+    below = np.cumsum(counts)
+    # Numero di `y` all'interno del cerchio per ciascun possibile valore di `x`...
+    per_value = below[THRESHOLD]
+    # ... e quindi per ciascuna riga
+    n_in = 0
+    trace = Trace()
+    for start in range(0, n, BLOCK):
+        cum = np.cumsum(per_value[nums[start:start + BLOCK]]) + n_in
+        trace.extend(cum * 4 / (n * np.arange(start + 1, start + len(cum) + 1)))
+        n_in = int(cum[-1])
+    # La coppia (x, y) compare counts[x] · counts[y] volte
+    pairs = np.outer(counts, counts)
+    density = np.stack([np.where(INSIDE, 0, pairs), np.where(INSIDE, pairs, 0)])
+    steps, values = trace.points()
+    return Result(n_in * 4 / (n * n), n_in, n * n, density, values, steps)
+
+
+# --- Calcolo in parallelo ---
+
+def _partial(batches: Iterable[tuple[np.ndarray, np.ndarray]], n: int, stride: int) -> Partial:
+    """Conta i punti all'interno del cerchio, conservando il conteggio ogni `stride` punti."""
+    n_in = 0
+    done = 0
+    samples: list[np.ndarray] = []
+    density = np.zeros((2, GRID, GRID), dtype=np.int64)
+    for x, y in batches:
+        inside = x * x + y * y <= K
+        density += _density(x, y, inside)
+        cum = np.cumsum(inside) + n_in
+        # Indice (nel batch) del primo punto multiplo di `stride` (contando dall'inizio del blocco)
+        samples.append(cum[(-done - 1) % stride::stride])
+        n_in = int(cum[-1])
+        done += len(cum)
+    steps = np.arange(stride, n + 1, stride)
+    if n % stride:
+        # Aggiungi sempre l'ultimo punto del blocco
+        steps = np.append(steps, n)
+        samples.append(np.array([n_in]))
+    return Partial(n_in, n, steps, np.concatenate(samples), density)
+
+
+def _pairs_block(x: np.ndarray, y: np.ndarray, stride: int) -> Partial:
+    """Elabora un blocco di punti già noti (ad esempio, presi dal TRNG)."""
+    return _partial([(x, y)], len(x), stride)
+
+
+def _pseudo_block(seed: np.random.SeedSequence, n: int, stride: int) -> Partial:
+    """Elabora un blocco di `n` punti pseudocasuali, generati con un flusso indipendente."""
+    rng = np.random.Generator(np.random.PCG64(seed))
+
+    def batches() -> Iterator[tuple[np.ndarray, np.ndarray]]:
+        for start in range(0, n, BLOCK):
+            yield pseudo(rng, min(BLOCK, n - start))
+
+    return _partial(batches(), n, stride)
+
+
+def _merge(partials: Iterable[Partial]) -> Result:
+    """Combina (nell'ordine dato) i risultati parziali dei blocchi."""
+    n_in = 0
+    n = 0
+    steps: list[np.ndarray] = []
+    cums: list[np.ndarray] = []
+    density = np.zeros((2, GRID, GRID), dtype=np.int64)
+    for partial in partials:
+        steps.append(partial.steps + n)
+        cums.append(partial.cum + n_in)
+        density += partial.density
+        n_in += partial.n_in
+        n += partial.n
+    all_steps = np.concatenate(steps)
+    trace = np.concatenate(cums) * 4 / all_steps
+    return Result(n_in * 4 / n, n_in, n, density, trace, all_steps)
+
+
+def parallel_pairs(x: np.ndarray, y: np.ndarray, jobs: int | None = None) -> Result:
+    """Come `estimate()`, ma in parallelo su `jobs` processi (di default, uno per CPU).
+
+    I punti vengono divisi in blocchi contigui e disgiunti di `BLOCK` punti;
+    l'andamento della stima viene diluito a circa `MAX_TRACE` valori.
+    """
+    n = len(x)
+    stride = max(1, n // MAX_TRACE)
+    starts = range(0, n, BLOCK)
+    with ProcessPoolExecutor(jobs) as executor:
+        return _merge(executor.map(
+            _pairs_block,
+            [x[i:i + BLOCK] for i in starts],
+            [y[i:i + BLOCK] for i in starts],
+            [stride] * len(starts),
+        ))
+
+
+def parallel_pseudo(
+    n: int, seed: int | np.random.SeedSequence | None = None, jobs: int | None = None
+) -> Result:
+    """Stima π con `n` punti pseudocasuali, in parallelo su `jobs` processi (di default, uno per CPU).
+
+    Ogni blocco di `BLOCK` punti ha un flusso pseudocasuale indipendente, ottenuto da `seed`
+    tramite `SeedSequence.spawn()`: il risultato dipende soltanto da `seed` e `n`, non da `jobs`.
+    """
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    stride = max(1, n // MAX_TRACE)
+    sizes = [min(BLOCK, n - start) for start in range(0, n, BLOCK)]
+    with ProcessPoolExecutor(jobs) as executor:
+        return _merge(executor.map(_pseudo_block, seed.spawn(len(sizes)), sizes, [stride] * len(sizes)))
+
+
+# --- Arresto alla precisione richiesta ---
+
+# Una sorgente di punti: dato il numero di punti richiesti, restituisce al massimo altrettanti punti
+#   (nessun punto quando la sorgente è esaurita)
+Source = Callable[[int], tuple[np.ndarray, np.ndarray]]
+
+
+def sequential_source(nums: list[int] | np.ndarray) -> Source:
+    """Sorgente di punti (x, y) sequenziali, come `sequential()`."""
+    x, y = sequential(nums)
+    return _array_source(x, y)
+
+
+def linked_source(nums: list[int] | np.ndarray) -> Source:
+    """Sorgente di punti (x, y) adiacenti, come `linked()`."""
+    x, y = linked(nums)
+    return _array_source(x, y)
+
+
+def _array_source(x: np.ndarray, y: np.ndarray) -> Source:
+    done = 0
+
+    def draw(n: int) -> tuple[np.ndarray, np.ndarray]:
+        nonlocal done
+        start, done = done, min(done + n, len(x))
+        return x[start:done], y[start:done]
+
+    return draw
+
+
+def pseudo_source(rng: np.random.Generator) -> Source:
+    """Sorgente (inesauribile) di punti (x, y) pseudocasuali, come `pseudo()`."""
+    return lambda n: pseudo(rng, n)
+
+
+def z_score(confidence: float) -> float:
+    """Il numero di deviazioni standard corrispondente al livello di confidenza dato (bilatero)."""
+    return NormalDist().inv_cdf((1 + confidence) / 2)
+
+
+def wilson(n_in: np.ndarray | int, n: np.ndarray | int, z: float) -> tuple[np.ndarray, np.ndarray]:
+    """Intervallo di Wilson (centro e semiampiezza) sul valore atteso della stima, dati `n_in` punti interni su `n`."""
+    p = np.asarray(n_in) / n
+    z2n = z * z / n
+    center = (p + z2n / 2) / (1 + z2n)
+    half = z / (1 + z2n) * np.sqrt(p * (1 - p) / n + z2n / (4 * n))
+    # π = 4 · p
+    return 4 * center, 4 * half
+
+
+def converge(
+    draw: Source,
+    tol: float,
+    confidence: float = 0.95,
+    max_points: int | None = None,
+    min_points: int = 100,
+) -> Result:
+    """Stima π fino a che l'intervallo di confidenza (di Wilson) ha semiampiezza al massimo `tol`.
+
+    I punti vengono richiesti a `draw` in batch sempre più grandi, dimensionati in base alla stima
+    dei punti ancora necessari; all'interno di ogni batch si controlla ogni singolo punto,
+    in modo da fermarsi esattamente al primo che soddisfa la precisione richiesta
+    (ma non prima di `min_points` punti). Se la sorgente si esaurisce prima, o si raggiungono
+    `max_points` punti, viene restituita la stima ottenuta fino a quel momento.
+
+    Nota: l'intervallo riguarda il valore atteso della stima; con coordinate intere da 0 a 255
+    questo vale circa 3.1327 (e non π), perché la griglia di punti non approssima perfettamente il cerchio.
+    """
+    z = z_score(confidence)
+    n_in = 0
+    n = 0
+    density = np.zeros((2, GRID, GRID), dtype=np.int64)
+    trace = Trace()
+    size = 1024
+    while max_points is None or n < max_points:
+        if max_points is not None:
+            size = min(size, max_points - n)
+        x, y = draw(size)
+        if len(x) == 0:
+            break  # Sorgente esaurita
+        inside = x * x + y * y <= K
+        cum = np.cumsum(inside) + n_in
+        count = np.arange(n + 1, n + len(cum) + 1)
+        # Primo punto (se c'è) a cui la precisione richiesta è raggiunta
+        ok = wilson(cum, count, z)[1] <= tol
+        ok[:max(0, min_points - n - 1)] = False
+        stop = int(np.argmax(ok)) + 1 if ok.any() else len(cum)
+        cum, count = cum[:stop], count[:stop]
+        density += _density(x[:stop], y[:stop], inside[:stop])
+        trace.extend(cum * 4 / count)
+        n_in, n = int(cum[-1]), int(count[-1])
+        if stop < len(ok) or ok[-1]:
+            break
+        # Stima di quanti punti servono ancora: la semiampiezza scala come 1/√n
+        p = n_in / n
+        needed = int((4 * z / tol) ** 2 * max(p * (1 - p), 1 / n)) - n
+        size = max(1024, min(BLOCK, needed, 2 * size))
+    if not n:
+        raise ValueError("Cannot estimate π without any point.")
+    steps, values = trace.points()
+    center, half = wilson(n_in, n, z)
+    return Result(
+        n_in * 4 / n, n_in, n, density, values, steps,
+        (float(center - half), float(center + half)),
+    )
+
+
+# --- Riduzione della varianza ---
+
+def stratified(nums: list[int] | np.ndarray, strata: int = 16) -> Result:
+    """Stima π campionando a turno ciascuna delle `strata`² celle in cui è divisa la griglia 256×256.
+
+    `strata` dev'essere una potenza di 2 (al massimo 128); la posizione all'interno della cella
+    richiede 2 · (8 - log2(strata)) bit casuali, cioè 1 byte per punto con 16 × 16 celle.
+    Vengono usati soltanto giri completi: se i numeri non bastano per un giro, `strata` viene dimezzato.
+    """
+    if strata < 1 or strata > 128 or strata & (strata - 1):
+        raise ValueError(f"The number of strata per axis must be a power of 2 in [1, 128], not {strata}.")
+    bits = np.unpackbits(np.asarray(nums, dtype=np.uint8))
+    while True:
+        per_axis = 8 - strata.bit_length() + 1  # Bit per coordinata all'interno della cella
+        n = len(bits) // (2 * per_axis) // strata**2 * strata**2
+        if n or strata == 1:
+            break
+        strata //= 2
+    if not n:
+        raise ValueError("Not enough random numbers to generate a single point.")
+    # Offset all'interno della cella
+    weights = 1 << np.arange(per_axis - 1, -1, -1)
+    offsets = bits[:n * 2 * per_axis].reshape(n, 2, per_axis) @ weights
+    # Cella (strato) di ciascun punto, a turno
+    cell = np.arange(n) % strata**2
+    width = 256 // strata
+    x = cell // strata * width + offsets[:, 0]
+    y = cell % strata * width + offsets[:, 1]
+    # Varianza (per punto) esatta: p(1 - p) per il metodo 0, media di p_s(1 - p_s) sugli strati
+    p_s = INSIDE.reshape(strata, width, strata, width).mean(axis=(1, 3))
+    vrf = P_INSIDE * (1 - P_INSIDE) / float(np.mean(p_s * (1 - p_s)))
+    return estimate(x, y)._replace(vrf=vrf, entropy=(n * 2 * per_axis + 7) // 8)
+
+
+def antithetic(nums: list[int] | np.ndarray) -> Result:
+    """Stima π con coppie di punti antitetici: (x, y) e (255 - x, 255 - y).
+
+    Ogni coppia di numeri genera due punti, negativamente correlati (uno vicino all'origine,
+    l'altro lontano): serve 1 solo byte per punto, invece di 2.
+    """
+    x, y = sequential(nums)
+    X = np.stack([x, 255 - x], axis=1).ravel()
+    Y = np.stack([y, 255 - y], axis=1).ravel()
+    # Varianza (per punto) esatta: per ogni coppia conta la media `g` dei due punti
+    g = (INSIDE.astype(np.float64) + INSIDE[::-1, ::-1]) / 2
+    vrf = P_INSIDE * (1 - P_INSIDE) / (2 * float(g.var()))
+    return estimate(X, Y)._replace(vrf=vrf, entropy=2 * len(x))
+
+
+def radical_inverse(i: np.ndarray, base: int) -> np.ndarray:
+    """La funzione radice inversa di van der Corput, in base `base`, degli interi `i`."""
+    i = np.array(i, dtype=np.int64)
+    result = np.zeros(len(i))
+    f = 1.0
+    while np.any(i):
+        f /= base
+        result += f * (i % base)
+        i //= base
+    return result
+
+
+def halton(n: int) -> tuple[np.ndarray, np.ndarray]:
+    """I primi `n` punti della sequenza di Halton in [0, 1)² (basi 2 e 3), escluso l'origine."""
+    i = np.arange(1, n + 1)
+    return radical_inverse(i, 2), radical_inverse(i, 3)
+
+
+def quasi(nums: list[int] | np.ndarray, points: int = 1 << 16, replicates: int = 16) -> Result:
+    """Stima π con la sequenza (a bassa discrepanza) di Halton, traslata casualmente con i numeri del TRNG.
+
+    Ogni replica usa 8 byte per una traslazione casuale modulo 1 (rotazione di Cranley-Patterson)
+    degli stessi `points` punti; la varianza è stimata dalla dispersione tra le repliche.
+    Le coordinate sono in [0, 1)², quindi (a differenza degli altri metodi) il valore atteso è proprio π;
+    la densità dei punti è calcolata su una griglia di GRID×GRID celle uguali.
+    """
+    nums = np.asarray(nums, dtype=np.uint8)
+    replicates = min(replicates, len(nums) // 8)
+    if not replicates:
+        raise ValueError("Not enough random numbers to shift the sequence: at least 8 are needed.")
+    shifts = nums[:8 * replicates].view(">u4").reshape(replicates, 2) / 2**32
+    hx, hy = halton(points)
+    # Numero di punti all'interno per ciascuna replica
+    hits = np.zeros(replicates, dtype=np.int64)
+
+    def batches() -> Iterator[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        for r, (sx, sy) in enumerate(shifts):
+            x = (hx + sx) % 1
+            y = (hy + sy) % 1
+            inside = x * x + y * y <= 1
+            hits[r] = np.count_nonzero(inside)
+            yield (x * GRID).astype(np.intp), (y * GRID).astype(np.intp), inside
+
+    result = _accumulate(batches())
+    vrf = None
+    if replicates > 1:
+        estimates = hits / points * 4
+        p = result.pi / 4
+        var_mc = 16 * p * (1 - p) / result.n
+        var_qmc = float(estimates.var(ddof=1)) / replicates
+        vrf = var_mc / var_qmc if var_qmc else float("inf")
+    return result._replace(vrf=vrf, entropy=8 * replicates)
+
+
+__all__ = [
+    "K", "GRID", "Result", "Trace", "sequential", "linked", "pseudo", "estimate", "from_source", "all_pairs",
+    "parallel_pairs", "parallel_pseudo",
+    "Source", "sequential_source", "linked_source", "pseudo_source", "z_score", "wilson", "converge",
+    "stratified", "antithetic", "radical_inverse", "halton", "quasi",
+]
@@ -30,19 +30,13 @@ cdef str style_pi(str pi, int i, str OK, str K0, str KO)
     width=int,
     title=str,
     BUG=bint,
+    DRBG=bint,
+    JOBS=object,
+    TOL=object,
+    CONFIDENCE=double,
     MODE=bint,
     TRG=object,
-    LEN=int,
-    N_in=int,
-    x_in=list,
-    x_out=list,
-    y_in=list,
-    y_out=list,
-    pi_array=list,
-    squares=list,
-    i=int,
-    x=int,
-    y=int,
+    result=object,
     pi=object,
     l=int,
     spi=str,
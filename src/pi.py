@@ -1,24 +1,43 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """Utilizza il TRNG per stimare π tramite il metodo Monte Carlo."""
-import os
-import sys
-import random
-from math import pi as PI
+from __future__ import annotations
+from typing import Any
+from contextlib import nullcontext
+from math import pi as PI, isfinite
 from pathlib import Path
-import matplotlib.pyplot as plt
+import argparse
+import shutil
+import json
+import time
+import csv
+import sys
+import os
+import numpy as np
 from rand import TrueRandomGenerator
+from drbg import ExpandedRandomGenerator
 from log import getLogger, style, sprint
+import montecarlo
 
 
 # Costanti
-K = 255**2
 SRC = Path(__file__).parent  # Cartella di questo file
 L = getLogger(__name__)  # Logger per questo file
 
 # Se l'output è formattato male, imposta questa flag a `False`
 UNICODE_BOX: bool = True  # False
 
+# Algoritmi disponibili
+ALGORITHMS: list[str] = [
+    "Interpret data as sequential (x, y) points.",
+    "Interpret data as adjacent/linked (x, y) points.",
+    "Generate every possible (x, y) combination.",
+    "Use pseudo-random (x, y) points.",
+    "Use stratified sampling over the 256×256 grid.",
+    "Use antithetic pairs of points.",
+    "Use a Halton low-discrepancy sequence, randomly shifted.",
+]
+
 
 def bug(default: bool, /) -> bool:
     """Determina se è stato attivato il “bug” da riga di comando."""
@@ -41,6 +60,65 @@ def bug(default: bool, /) -> bool:
     return default
 
 
+def drbg() -> bool:
+    """Determina se i punti pseudocasuali vanno generati con un DRBG inizializzato dal TRNG."""
+    # $ python pi.py 3           # --> `random` della libreria standard
+    # $ python pi.py 3 --drbg    # --> HMAC-DRBG con seme preso dal TRNG
+    if "--drbg" in sys.argv:
+        sys.argv = [x for x in sys.argv if x != "--drbg"]
+        return True
+    return False
+
+
+def option(name: str) -> str | None:
+    """Estrae da riga di comando il valore dell'opzione `name` (`name VALORE` o `name=VALORE`)."""
+    for i, arg in enumerate(sys.argv):
+        if arg == name and i + 1 < len(sys.argv):
+            del sys.argv[i]
+            return sys.argv.pop(i)
+        if arg.startswith(f"{name}="):
+            del sys.argv[i]
+            return arg.removeprefix(f"{name}=")
+    return None
+
+
+def jobs() -> int | None:
+    """Determina il numero di processi da utilizzare (`None` per non calcolare in parallelo)."""
+    # $ python pi.py 3             # --> un solo processo, come di consueto
+    # $ python pi.py 3 --jobs 8    # --> 8 processi
+    # $ python pi.py 3 --jobs 0    # --> un processo per CPU
+    value = option("--jobs")
+    if value is None:
+        return None
+    try:
+        n = int(value)
+    except ValueError:
+        L.warning(f"Invalid number of jobs {value!r}: running on a single process.")
+        return None
+    return n or os.cpu_count() or 1
+
+
+def precision() -> tuple[float | None, float]:
+    """Determina la precisione richiesta su π (`None` per usare tutti i punti) e il livello di confidenza."""
+    # $ python pi.py 0 --tol 0.01             # --> semiampiezza dell'intervallo ≤ 0.01
+    # $ python pi.py 3 --digits 4             # --> 4 cifre corrette (semiampiezza ≤ 0.0005)
+    # $ python pi.py 3 --digits 4 --confidence 0.99
+    tol = option("--tol")
+    digits = option("--digits")
+    confidence = option("--confidence")
+    try:
+        TOL = float(tol) if tol else 0.5 * 10 ** (1 - int(digits)) if digits else None
+        CONFIDENCE = float(confidence) if confidence else 0.95
+    except ValueError:
+        L.warning("Invalid precision or confidence level: using all the available points.")
+        return None, 0.95
+    # Una precisione non positiva non verrebbe mai raggiunta; la confidenza è una probabilità in (0, 1)
+    if (TOL is not None and not TOL > 0) or not 0 < CONFIDENCE < 1:
+        L.warning("The precision must be positive and the confidence level in (0, 1): using all the available points.")
+        return None, 0.95
+    return TOL, CONFIDENCE
+
+
 def mode() -> int:
     """Determina l'algoritmo da utilizzare."""
     # Controlla se l'algoritmo è stato selezionato da riga di comando.
@@ -57,18 +135,14 @@ def mode() -> int:
             pass
         else:
             # Controlla se il numero inserito è valido
-            if 0 <= _mode <= 3:
+            if 0 <= _mode < len(ALGORITHMS):
                 # Valido
                 return _mode
             # Non valido: continua con la selezione interattiva
     # Selezione interattiva dell'algoritmo
-    print("""
->>> Please choose an algorithm:
- [0] Interpret data as sequential (x, y) points.
- [1] Interpret data as adjacent/linked (x, y) points.
- [2] Generate every possible (x, y) combination.
- [3] Use pseudo-random (x, y) points.\
-""")
+    print("\n>>> Please choose an algorithm:")
+    for i, description in enumerate(ALGORITHMS):
+        print(f" [{i}] {description}")
     # Richiede all'utente l'algoritmo da utilizzare (il valore di "_mode")
     _mode: int = 0
     while True:
@@ -79,23 +153,161 @@ def mode() -> int:
             sys.exit(0)
         # Gestione errori: input non intero (chiede nuovamente)
         except:
-            L.warning("Algorithm index has to be an integer (0|1|2|3)!")
+            L.warning(f"Algorithm index has to be an integer ({'|'.join(map(str, range(len(ALGORITHMS))))})!")
             continue
         # Numero intero: ok
         else:
             # Troppo grande o troppo piccolo (chiede nuovamente)
-            if _mode > 3 or _mode < 0:
-                L.warning(f"Invalid integer `{_mode}` (has to be in [0, 3])!")
+            if _mode >= len(ALGORITHMS) or _mode < 0:
+                L.warning(f"Invalid integer `{_mode}` (has to be in [0, {len(ALGORITHMS) - 1}])!")
                 continue
             # Tutto ok: "_mode" è impostato e si continua col programma
             return _mode  # questo 'return' interrompe il ciclo 'while' e ritorna il valore di '_mode'
 
 
+def compute(
+    MODE: int,
+    TRG: TrueRandomGenerator,
+    *,
+    DRBG: bool = False,
+    JOBS: int | None = None,
+    TOL: float | None = None,
+    CONFIDENCE: float = 0.95,
+    BUDGET: int | None = None,
+    SEED: int | None = None,
+) -> montecarlo.Result:
+    """Stima π con l'algoritmo `MODE`, utilizzando i numeri casuali di `TRG`.
+
+    `BUDGET` è il numero massimo di punti da utilizzare (per l'algoritmo 2, di numeri da combinare;
+    per l'algoritmo 6, di punti per replica); `SEED` è il seme per i punti pseudocasuali senza `DRBG`.
+    """
+    nums = TRG.random_numbers
+
+    def rng() -> np.random.Generator:
+        # Con `DRBG`, il generatore pseudocasuale riceve il seme dal TRNG
+        return ExpandedRandomGenerator(TRG).generator() if DRBG else np.random.default_rng(SEED)
+
+    def budget(x: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        return (x[:BUDGET], y[:BUDGET]) if BUDGET else (x, y)
+
+    if TOL and MODE not in (0, 1, 3):
+        # Gli altri algoritmi usano i punti tutti insieme (o non indipendenti): non ha senso fermarsi prima
+        L.warning(f"Algorithm [{MODE}] always uses every point: ignoring the requested precision.")
+        TOL = None
+    if TOL and JOBS:
+        # I punti vengono controllati uno alla volta, nell'ordine: non si possono dividere tra più processi
+        L.warning("Stopping at the requested precision runs on a single process: ignoring the number of jobs.")
+
+    # ------ Arresto alla precisione richiesta (metodi 1, 2 e pseudocasuali) ------
+    if TOL:
+        if MODE == 0:
+            source = montecarlo.sequential_source(nums)
+        elif MODE == 1:
+            source = montecarlo.linked_source(nums)
+        else:
+            source = montecarlo.pseudo_source(rng())
+        result = montecarlo.converge(source, TOL, CONFIDENCE, max_points=BUDGET)
+        assert result.interval is not None
+        lo, hi = result.interval
+        if (hi - lo) / 2 > TOL:
+            L.warning(f"Requested precision not reached: stopped after {result.n} points.")
+        # (l'intervallo riguarda il valore atteso della stima, che sulla griglia di punti interi non è esattamente π)
+        L.info(f"Used {result.n} points: E[estimate] ∈ [{lo}, {hi}] ({CONFIDENCE:.0%} confidence).")
+
+    # ------------------------- Metodo 1: base, O(n) --------------------------
+    elif MODE == 0:
+        # Generazione di coordinate con due numeri casuali sequenziali
+        xy = budget(*montecarlo.sequential(nums))
+        result = montecarlo.parallel_pairs(*xy, jobs=JOBS) if JOBS else montecarlo.estimate(*xy)
+
+    # -------------- Metodo 2: coppie di valori adiacenti, O(n) ---------------
+    elif MODE == 1:
+        # L'`y` di un punto diventa l'`x` del successivo
+        xy = budget(*montecarlo.linked(nums))
+        result = montecarlo.parallel_pairs(*xy, jobs=JOBS) if JOBS else montecarlo.estimate(*xy)
+
+    # ---------- Metodo 3: tutte le coordinate possibili, O(n + 256) ----------
+    elif MODE == 2:
+        # Invece di provare tutte le n² coppie, conta quante volte compare ciascun valore:
+        #   per ogni `x` bastano i numeri ≤ della soglia `THRESHOLD[x]`.
+        result = montecarlo.all_pairs(nums[:BUDGET])
+
+    # ------------- Metodo 4: campionamento stratificato, O(n) ----------------
+    elif MODE == 4:
+        # La griglia è divisa in 16×16 celle, campionate a turno: basta 1 byte per punto
+        result = montecarlo.stratified(nums[:BUDGET])
+
+    # ------------------- Metodo 5: coppie antitetiche, O(n) ------------------
+    elif MODE == 5:
+        # Ogni punto (x, y) è accompagnato dal suo opposto (255 - x, 255 - y): 1 byte per punto
+        result = montecarlo.antithetic(nums[:BUDGET])
+
+    # --------- Metodo 6: sequenza di Halton traslata casualmente, O(n) --------
+    elif MODE == 6:
+        # Il TRNG serve soltanto per le traslazioni casuali (8 byte per replica)
+        result = montecarlo.quasi(nums, **({"points": BUDGET} if BUDGET else {}))
+
+    # ---------------------- Metodo pseudocasuali, O(n) -----------------------
+    else:
+        # Procedimento analogo al metodo 1, eccetto che i numeri "casuali" utilizzati sono
+        #   generati in maniera pseudocasuale dal computer.
+        #   Di default, i valori sono 100 volte di più di quelli del metodo 1
+        n = BUDGET or TRG.n_random_numbers * 100
+        if JOBS:
+            # Ogni processo riceve un flusso indipendente, derivato dallo stesso seme
+            seed = np.random.SeedSequence(
+                int.from_bytes(ExpandedRandomGenerator(TRG).random_bytes(32), "big") if DRBG else SEED
+            )
+            result = montecarlo.parallel_pseudo(n, seed, jobs=JOBS)
+        else:
+            result = montecarlo.from_source(montecarlo.pseudo_source(rng()), n)
+
+    if result.vrf is not None:
+        L.info(
+            f"Variance reduction factor (vs. algorithm [0], same number of points): {result.vrf:.4g}; "
+            f"{result.n} points from {result.entropy} random bytes."
+        )
+    return result
+
+
+def plot(result: montecarlo.Result, *, show: bool = True, directory: Path | None = None, fmt: str = "png") -> None:
+    """Disegna i punti e l'andamento della stima di π.
+
+    Se `directory` è specificata, i grafici vengono salvati lì (come `points.<fmt>` e `trace.<fmt>`).
+    """
+    # La libreria `matplotlib` serve soltanto qua: importarla all'inizio di tutto il programma è sconveniente
+    import matplotlib.pyplot as plt  # pylint: disable=import-outside-toplevel
+
+    def done(name: str) -> None:
+        if directory is not None:
+            plt.savefig(directory / f"{name}.{fmt}")
+        if show:
+            plt.show()
+        plt.close()
+
+    if result.density is not None:
+        # Disegna la densità dei punti sulla griglia (all'interno e all'esterno del cerchio):
+        #   a differenza di un grafico a dispersione, il costo non dipende dal numero di punti
+        extent = (-0.5, montecarlo.GRID - 0.5, -0.5, montecarlo.GRID - 0.5)
+        for density, cmap in [(result.density[1], "Blues"), (result.density[0], "Oranges")]:
+            # Le celle vuote restano trasparenti
+            plt.imshow(
+                np.ma.masked_equal(density, 0).T, cmap=cmap, origin="lower", extent=extent, interpolation="nearest"
+            )
+        plt.gca().set_aspect("equal", adjustable="box")
+        done("points")
+
+    # Disegna l'andamento (diluito) della stima di π in funzione del numero di punti (o di righe)
+    plt.plot(result.steps, result.trace)
+    plt.axhline(PI, linestyle="dashed", color="C1")
+    done("trace")
+
+
 # Funzione principale
 def main():
     """Calcola π tramite il metodo Monte Carlo, utilizzando il nostro TRNG."""
     # Stampa il titolo
-    width = os.get_terminal_size().columns
+    width = shutil.get_terminal_size().columns
     title = " Monte Carlo Method π Approximator "
     sprint(f"{title:=^{width}}", style="bold")  # see https://pyformat.info/ for why this works
 
@@ -105,132 +317,30 @@ def main():
     # Comunica se BUG è attivo (per sicurezza)
     L.info(f"BUG is {'en' if BUG else 'dis'}abled.")
 
+    # Determina se usare il DRBG per i punti pseudocasuali
+    DRBG = drbg()
+
+    # Determina il numero di processi da utilizzare
+    JOBS = jobs()
+    if JOBS:
+        L.info(f"Running on {JOBS} processes.")
+
+    # Determina la precisione richiesta (se c'è)
+    TOL, CONFIDENCE = precision()
+    if TOL:
+        L.info(f"Stopping at ±{TOL} ({CONFIDENCE:.0%} confidence).")
+
     # Determina l'algoritmo da utilizzare
     MODE: int = mode()  # Usa la funzione sopra definita
     L.info(f"Using algorithm [{MODE}].")  # Stampa l'algoritmo, per sicurezza
 
-    # Inizializzazione
+    # Calcolo
     TRG = TrueRandomGenerator(bug=BUG)  # Il nostro generatore
-    LEN = TRG.n_random_numbers  # Numero di valori casuali disponibili
-    N_in:     int         = 0   # Numero di coordinate casuali all'interno del cerchio  # noqa
-    x_in:     list[int]   = []  # Lista delle coordinate x all'interno del cerchio      # noqa
-    y_in:     list[int]   = []  # Lista delle coordinate y all'interno del cerchio      # noqa
-    x_out:    list[int]   = []  # Lista delle coordinate x all'esterno del cerchio      # noqa
-    y_out:    list[int]   = []  # Lista delle coordinate y all'esterno del cerchio      # noqa
-    pi_array: list[float] = []  # Lista delle stime di π nel tempo
-    pi: float = 0  # Stima di π, ricalcolata ad ogni iterazione
-
-    # Pre-calcolo dei quadrati, per ottimizzazione
-    squares = [x**2 for x in TRG.random_numbers]
-
-    # ------------------------- Metodo 1: base, O(n) --------------------------
-    if MODE == 0:
-        for i in range(LEN // 2):
-            # Generazione di coordinate con due numeri casuali sequenziali
-            x = TRG.random_number()
-            y = TRG.random_number()
-
-            # Se il punto di coordinate (x, y) appartiene cerchio di raggio 255:
-            if x**2 + y**2 <= K:
-                N_in += 1  # incrementa il numero di coordinate all'interno,
-                x_in.append(x)  # salva la coordinata x nella lista dedicata,
-                y_in.append(y)  # salva la coordinata y nella lista dedicata.
-            else:  # Altrimenti, le coordinate (x, y) non appartengono al cerchio:
-                x_out.append(x)  # salva la coordinata x nella lista dedicata,
-                y_out.append(y)  # salva la coordinata y nella lista dedicata.
-
-            pi = N_in * 4 / (i + 1)  # Approssima π con i valori ottenuti finora
-            pi_array.append(pi)  # Salva questa stima nella lista dedicata
-
-        # Disegna i punti nel piano cartesiano
-        plt.scatter(x_in, y_in, marker=".")  # type: ignore
-        plt.scatter(x_out, y_out, marker=".")  # type: ignore
-        plt.gca().set_aspect("equal", adjustable="box")
-        plt.show()
-
-        # Disegna l'andamento della stima di π in funzione del numero di coordinate
-        plt.plot(pi_array)
-        plt.plot([PI] * (LEN // 2), linestyle="dashed")
-        plt.show()
-
-    # -------------- Metodo 2: coppie di valori adiacenti, O(n) ---------------
-    elif MODE == 1:
-        y = TRG.random_number()  # Assegnazione valore di default (pre-ciclo)
-        for i in range(LEN):
-            # L'`y` di prima diventa il nuovo `x`, mentre `y` diventa un nuovo numero casuale
-            x, y = y, TRG.random_number()
-            if x**2 + y**2 <= K:  # Analogo al metodo 1
-                N_in = N_in + 1
-                x_in.append(x)
-                y_in.append(y)
-            else:
-                x_out.append(x)
-                y_out.append(y)
-
-            pi = N_in * 4 / (i + 1)  # Approssima π con i valori ottenuti finora
-            pi_array.append(pi)  # Salva questa stima nella lista dedicata
-
-        # Disegna i punti nel piano cartesiano
-        plt.scatter(x_out, y_out, marker=".")  # type: ignore
-        plt.scatter(x_in, y_in, marker=".")  # type: ignore
-        plt.gca().set_aspect("equal", adjustable="box")
-        plt.show()
+    result = compute(MODE, TRG, DRBG=DRBG, JOBS=JOBS, TOL=TOL, CONFIDENCE=CONFIDENCE)
+    plot(result)
 
-        # Disegna l'andamento della stima di π in funzione del numero di coordinate
-        plt.plot(pi_array)
-        plt.plot([PI] * LEN, linestyle="dashed")
-        plt.show()
-
-    # ------------ Metodo 3: tutte le coordinate possibili, O(n^2) ------------
-    elif MODE == 2:
-        # `enumerate([a, b, c]) -> [(0, a), (1, b), (2, c)]`
-        # Questo ciclo scorre gli elementi (`x`) del vettore `nums`,
-        #   associando a ciascuno il proprio indice (`i`)
-        for i, x in enumerate(squares):
-            for y in squares:
-                if x + y <= K:  # Analogo al metodo 1
-                    N_in += 1
-            # Stima di π
-            pi_array.append(N_in * 4 / (LEN * (i + 1)))
-
-        # Stima finale di π (ultima stima calcolata)
-        pi = pi_array[-1]
-
-        # Disegna l'andamento della stima di π in funzione del numero di coordinate
-        plt.plot(pi_array, marker=".", linestyle="")
-        plt.plot([PI] * LEN, linestyle="dashed")
-        plt.show()
-
-    # ---------------------- Metodo pseudocasuali, O(n) -----------------------
-    else:
-        # Procedimento analogo al metodo 1, eccetto che i numeri "casuali" utilizzati sono
-        #   generati in maniera pseudocasuale dal computer.
-
-        # I valori sono 100 volte di più di quelli del metodo 1
-        for i in range(LEN * 100):
-            x = random.randint(0, 255)
-            y = random.randint(0, 255)
-            if x**2 + y**2 <= K:
-                N_in = N_in + 1
-                x_in.append(x)
-                y_in.append(y)
-            else:
-                x_out.append(x)
-                y_out.append(y)
-
-            pi = N_in * 4 / (i + 1)  # Approssima π con i valori ottenuti finora
-            pi_array.append(pi)  # Salva questa stima nella lista dedicata
-
-        # Disegna i punti nel piano cartesiano
-        plt.scatter(x_out, y_out, marker=".")  # type: ignore
-        plt.scatter(x_in,  y_in,  marker=".")  # type: ignore
-        plt.gca().set_aspect("equal", adjustable="box")
-        plt.show()
-
-        # Disegna l'andamento della stima di π in funzione del numero di coordinate
-        plt.plot(pi_array)
-        plt.plot([PI] * LEN * 100, linestyle="dashed")
-        plt.show()
+    # Stima finale di π
+    pi = result.pi
 
     # --- Stampa la stima finale di π ---
     # Per velocizzare i calcoli
@@ -287,6 +397,89 @@ def style_pi(pi: str, i: int, OK: str, K0: str, KO: str) -> str:
     return s
 
 
-# Chiama "main()" quando il programma viene eseguito direttamente
+def batch(argv: list[str] | None = None) -> int:
+    """Calcola π senza interazione con l'utente, scrivendo i risultati in JSON o CSV.
+
+    python pi.py --batch --mode 3 --budget 1000000 --format csv --output results.csv --plot plots/
+    """
+    parser = argparse.ArgumentParser(
+        prog="pi.py --batch",
+        description="Estimate π with the Monte Carlo method, without any user interaction.",
+    )
+    parser.add_argument("--mode", type=int, choices=range(len(ALGORITHMS)), default=0, help="algorithm to use")
+    parser.add_argument("--bug", action=argparse.BooleanOptionalAction, default=True, help="TRNG `bug=` flag")
+    parser.add_argument("--budget", type=int, help="maximum number of points to use")
+    parser.add_argument("--file", type=Path, action="append", help="data file(s) for the TRNG")
+    parser.add_argument("--drbg", action="store_true", help="seed pseudo-random points from the TRNG")
+    parser.add_argument("--seed", type=int, help="seed for pseudo-random points (without --drbg)")
+    parser.add_argument("--jobs", type=int, help="number of processes (0: one per CPU)")
+    parser.add_argument("--tol", type=float, help="stop when the confidence interval half-width is below this")
+    parser.add_argument("--digits", type=int, help="stop when this many digits are known (sets --tol)")
+    parser.add_argument("--confidence", type=float, default=0.95, help="confidence level (default: 0.95)")
+    parser.add_argument("--format", choices=["json", "csv"], default="json", help="output format")
+    parser.add_argument("--output", type=Path, help="output file (default: standard output)")
+    parser.add_argument("--plot", type=Path, metavar="DIR", help="save plots to this directory")
+    parser.add_argument("--plot-format", default="png", help="plot file format (default: png)")
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+    if args.tol is not None and not args.tol > 0:
+        parser.error("--tol must be positive")
+    if not 0 < args.confidence < 1:
+        parser.error("--confidence must be between 0 and 1 (excluded)")
+
+    TOL = args.tol or (0.5 * 10 ** (1 - args.digits) if args.digits else None)
+    JOBS = (args.jobs or os.cpu_count() or 1) if args.jobs is not None else None
+    if TOL and JOBS and args.mode in (0, 1, 3):
+        parser.error(f"--jobs cannot be used with --tol or --digits: algorithm [{args.mode}] stops on a single process")
+
+    t0 = time.perf_counter()
+    TRG = TrueRandomGenerator(bug=args.bug, files=args.file)
+    t1 = time.perf_counter()
+    result = compute(
+        args.mode, TRG,
+        DRBG=args.drbg, JOBS=JOBS, TOL=TOL, CONFIDENCE=args.confidence, BUDGET=args.budget, SEED=args.seed,
+    )
+    t2 = time.perf_counter()
+
+    if args.plot is not None:
+        # Nessuna finestra: disegna direttamente su file
+        import matplotlib  # pylint: disable=import-outside-toplevel
+        matplotlib.use("Agg")
+        args.plot.mkdir(parents=True, exist_ok=True)
+        plot(result, show=False, directory=args.plot, fmt=args.plot_format)
+
+    row: dict[str, Any] = dict(
+        mode=args.mode,
+        bug=args.bug,
+        drbg=args.drbg,
+        pi=result.pi,
+        error=result.pi - PI,
+        n_in=result.n_in,
+        n=result.n,
+        expected_low=result.interval[0] if result.interval else None,
+        expected_high=result.interval[1] if result.interval else None,
+        vrf=result.vrf,
+        entropy=result.entropy,
+        time_load=t1 - t0,
+        time_compute=t2 - t1,
+    )
+    with (args.output.open("w", newline="") if args.output else nullcontext(sys.stdout)) as out:
+        if args.format == "json":
+            # Il JSON standard non ammette infiniti e NaN (ad esempio, un `vrf` infinito): diventano `null`
+            finite = {
+                key: None if isinstance(value, float) and not isfinite(value) else value for key, value in row.items()
+            }
+            json.dump(finite, out, indent=2, allow_nan=False)
+            out.write("\n")
+        else:
+            writer = csv.DictWriter(out, fieldnames=list(row))
+            writer.writeheader()
+            writer.writerow(row)
+    return 0
+
+
+# Chiama "main()" (o "batch()", con `--batch`) quando il programma viene eseguito direttamente
 if __name__ == "__main__":
+    if "--batch" in sys.argv:
+        sys.argv.remove("--batch")
+        sys.exit(batch())
     main()
@@ -3,10 +3,14 @@
 """Questo modulo contiene un generatore di numeri veramente casuali (TRNG)."""
 from __future__ import annotations
 from pathlib import Path
-from typing import Literal, NamedTuple, overload
+from typing import Literal, NamedTuple, Protocol, overload
 from enum import Flag, auto
+import random
+import numpy as np
 from log import getLogger
+import hist
 import root
+import coincidenze
 
 # Determina la cartella dove si trova questo file
 SRC = Path(__file__).parent
@@ -34,6 +38,7 @@ class TrueRandomGenerator:
     # --- Variabili d'istanza ---
     # pubbliche
     delta_times:      list[int]  # Differenze dei tempi
+    flags:            np.ndarray  # Flag `coincidenze.Timing` di ciascun evento letto
     random_bits:      list[int]  # Bit (0|1) casuali
     random_numbers:   list[int]  # Numeri casuali (da 0 a 255)
     n_random_numbers: int        # Numero di numeri casuali
@@ -45,13 +50,15 @@ class TrueRandomGenerator:
     # O si specifica il parametro `file=`...
     @overload
     def __init__(
-        self, /, *, events: list[Event] | None = ..., file: Path | str | None = ..., bug: bool = False
+        self, /, *, events: list[Event] | None = ..., file: Path | str | None = ..., bug: bool = False,
+        pileup: int | None = None,
     ) -> None: ...
 
     # ... oppure `files=`...
     @overload
     def __init__(
-        self, /, *, events: list[Event] | None = ..., files: list[Path | str] | None = ..., bug: bool = False
+        self, /, *, events: list[Event] | None = ..., files: list[Path | str] | None = ..., bug: bool = False,
+        pileup: int | None = None,
     ) -> None: ...
     # ... ma non entrambi.
 
@@ -65,6 +72,7 @@ class TrueRandomGenerator:
         files: list[Path | str] | None = None,  # Apri uno o più file
         # Comportamento
         bug: bool = False,
+        pileup: int | None = None,  # Scarta gli eventi che distano al massimo `pileup` da un altro
     ) -> None:
 
         # --- 0. Lettura dei dati (eventi) ---
@@ -76,9 +84,24 @@ class TrueRandomGenerator:
         # Se `files=` non è stato specificato, ma `file=` sì, allora usa quel file
         #   Se invece nemmeno `file=` è stato specificato, non usare alcun file
         files = ([] if file is None else [file]) if files is None else files.copy()
-        # Apri i file in `files` e leggi l'albero "Data_R", aggiungendo i dati a `t`
-        for file in files:
-            events += root.read(file, "Data_R", cls=Event)
+        # Apri i file in `files` e leggi l'albero "Data_R": ogni fonte (gli eventi passati e ciascun file)
+        #   resta separata, perché i tempi di ciascuna ripartono da zero
+        sources = [events] + [root.read(file, "Data_R", cls=Event) for file in files]
+        events = [event for source in sources for event in source]
+        # Segna gli eventi troppo vicini nel tempo (i ∆t brevissimi non sono casuali), fonte per fonte
+        if pileup is None:
+            self.flags = np.zeros(len(events), dtype=np.uint8)
+        else:
+            self.flags = np.concatenate([np.zeros(0, dtype=np.uint8)] + [
+                coincidenze.flags(
+                    np.fromiter((event.Timestamp for event in source), dtype=np.int64, count=len(source)), pileup
+                )
+                for source in sources
+            ])
+            # Se richiesto, scartali
+            keep = coincidenze.accepted(self.flags, coincidenze.Timing.PILEUP)
+            L.info("Discarding %d piled-up events.", len(events) - int(keep.sum()))
+            events = [events[i] for i in np.flatnonzero(keep)]
         # Se non ci sono abbastanza eventi, riporta un errore e termina il programma
         if len(events) < 9:
             raise ValueError(
@@ -178,6 +201,116 @@ class TrueRandomGenerator:
         self._i = (self._i + 1) % self.n_random_numbers
         return num
 
+    # Metodo: restituisce `n` byte casuali, scorrendo ciclicamente come `random_number()`
+    def random_bytes(self, n: int) -> bytes:
+        """Restituisce `n` byte casuali (equivale a `n` chiamate di `random_number()`)."""
+        chunks: list[bytes] = []
+        while n > 0:
+            # Prendi tutti i byte possibili prima di dover tornare all'inizio
+            end = min(self._i + n, self.n_random_numbers)
+            chunks.append(bytes(self.random_numbers[self._i:end]))
+            n -= end - self._i
+            self._i = end % self.n_random_numbers
+        return b"".join(chunks)
+
+
+# Qualunque oggetto che fornisca byte casuali (come `TrueRandomGenerator`)
+class ByteSource(Protocol):
+    """Una sorgente di byte casuali."""
+
+    def random_bytes(self, n: int) -> bytes:
+        """Restituisce `n` byte casuali."""
+
+
+# Adattatore del TRNG per la libreria standard `random`
+class TrueRandom(random.Random):
+    """Un `random.Random` che attinge ai byte del TRNG (o di un'altra `ByteSource`) invece che al Mersenne Twister.
+
+    Tutti i metodi di `random.Random` (`randrange`, `choice`, `shuffle`, `sample`, ...)
+    funzionano senza distorsioni, consumando solo i bit strettamente necessari.
+
+    Esempio
+    -------
+    >>> r = TrueRandom()
+    >>> r.sample(["Rosalinda", "Jacopo", "Giacomo", "Riccardo"], 4)
+    """
+
+    # --- Variabili d'istanza ---
+    # pubbliche
+    bits_consumed: int                  # Bit di entropia utilizzati finora
+    # protette
+    _gen:          ByteSource           # La sorgente dei byte casuali
+    _reservoir:    int                  # Bit letti ma non ancora utilizzati...
+    _n_reservoir:  int                  # ... e quanti sono
+
+    def __init__(self, gen: ByteSource | None = None, /, **kwargs) -> None:
+        # Se il generatore non è stato specificato, creane uno con i parametri dati
+        self._gen = TrueRandomGenerator(**kwargs) if gen is None else gen
+        self._reservoir = 0
+        self._n_reservoir = 0
+        self.bits_consumed = 0
+        super().__init__()
+
+    # Metodo: restituisce un numero intero casuale di `k` bit
+    def getrandbits(self, k: int, /) -> int:
+        """Restituisce un intero casuale in [0, 2**k), consumando esattamente `k` bit."""
+        if k < 0:
+            raise ValueError("number of bits must be non-negative")
+        if k > self._n_reservoir:
+            # I bit rimasti non bastano: leggi soltanto i byte mancanti
+            n_bytes = (k - self._n_reservoir + 7) // 8
+            self._reservoir = (self._reservoir << 8 * n_bytes) | int.from_bytes(self._gen.random_bytes(n_bytes), "big")
+            self._n_reservoir += 8 * n_bytes
+        # Usa i `k` bit più significativi e conserva gli altri per le prossime chiamate
+        self._n_reservoir -= k
+        num = self._reservoir >> self._n_reservoir
+        self._reservoir &= (1 << self._n_reservoir) - 1
+        self.bits_consumed += k
+        return num
+
+    # Metodo: restituisce un numero decimale casuale in [0, 1)
+    def random(self) -> float:
+        """Restituisce un numero decimale casuale in [0, 1), usando 53 bit (la precisione di un `float`)."""
+        return self.getrandbits(53) * 2.0**-53
+
+    # Metodo: restituisce un numero intero casuale in [0, n)
+    def _randbelow(self, n: int) -> int:
+        # Algoritmo "Fast Dice Roller" (J. Lumbroso, 2013): si aggiunge un bit alla volta e,
+        #   in caso di rifiuto, si riutilizza l'avanzo, invece di scartare tutti i bit estratti.
+        #   Per `n` potenza di 2 consuma esattamente log2(n) bit, altrimenti poco più di log2(n) in media.
+        if n <= 0:
+            # (altrimenti il ciclo non terminerebbe mai: ad esempio, `choice([])`)
+            raise ValueError(f"Upper bound must be positive, not {n}.")
+        v, c = 1, 0  # `c` è uniforme in [0, v)
+        while True:
+            while v < n:
+                v <<= 1
+                c = (c << 1) | self.getrandbits(1)
+            if c < n:
+                return c
+            # Rifiuto: `c - n` è comunque uniforme in [0, v - n)
+            v -= n
+            c -= n
+
+    # I dati non dipendono da un seme: questi metodi non hanno senso
+    def seed(self, *args, **kwargs) -> None:  # pylint: disable=unused-argument
+        """Non fa nulla: i numeri casuali non dipendono da un seme."""
+        return None
+
+    # Lo stato non è quello del Mersenne Twister, ma la sorgente dei byte e i bit non ancora utilizzati
+    #   (così `pickle` e `copy` funzionano: con `copy.copy()` la sorgente è condivisa)
+    def getstate(self) -> tuple[ByteSource, int, int, int]:  # type: ignore
+        """Restituisce lo stato (sorgente dei byte e bit non ancora utilizzati)."""
+        return self._gen, self._reservoir, self._n_reservoir, self.bits_consumed
+
+    def setstate(self, state: tuple[ByteSource, int, int, int]) -> None:  # type: ignore
+        """Ripristina lo stato restituito da `getstate()`."""
+        self._gen, self._reservoir, self._n_reservoir, self.bits_consumed = state
+
+    def __reduce__(self):
+        # Ricrea l'oggetto dalla sua sorgente (senza leggere il file di default), poi ne ripristina lo stato
+        return type(self), (self._gen,), self.getstate()
+
 
 # Classe che contiene le flag per scegliere cosa mostrare nei grafici
 class PLOT(Flag):
@@ -220,9 +353,8 @@ def cyclic_local_means(data: list[int], spread: int = 5) -> list[float]:
     spread=5 --> [2.4, 2.2, 2.0, 3.0, 2.8, 2.6]
     spread=6 --> [2.5, 2.5, 2.5, 2.5, 2.5, 2.5]
     """
-    left = (spread - 1) // 2
-    length = len(data)
-    return [sum(data[(i + j - left) % length] for j in range(spread)) / spread for i in range(length)]
+    # Le somme cumulative rendono il calcolo O(n) invece che O(n·spread)
+    return hist.cyclic_local_means(data, spread=spread).tolist()
 
 
 # Funzione per testare il generatore
@@ -234,10 +366,13 @@ def test():
 
     gen = TrueRandomGenerator()
 
-    # Salva alcuni valori utili nel namespace locale
-    #   per velocizzare l'accesso
-    bits = gen.random_bits
-    nums = gen.random_numbers
+    # Calcola subito tutti gli istogrammi: a `matplotlib` passiamo solo i conteggi, non i dati
+    with L.task("Computing histograms"):
+        delta_times = np.asarray(gen.delta_times)
+        # ∆t in scala logaritmica (∆t = 0 finisce in `underflow`)
+        deltas_hist = hist.Histogram.log(1, max(2, int(delta_times.max()) + 1), 500).fill(delta_times)
+        bits_counts = hist.counts(gen.random_bits, 2)
+        nums_counts = hist.counts(gen.random_numbers, 256)
 
     if TO_PLOT:
         with L.task("Plotting required items") as plotting:
@@ -246,7 +381,8 @@ def test():
             # ------------------------ Differenze di tempo -------------------------
             if PLOT.TIME_DELTAS in TO_PLOT:
                 plotting.info(_plot_item_message.format(PLOT.TIME_DELTAS))
-                plt.hist(gen.delta_times, bins=500)
+                plt.stairs(deltas_hist.counts, deltas_hist.edges, fill=True)
+                plt.xscale("log")
                 plt.yscale("log")
                 plt.xlabel("Time difference between two conecutive events [Digitizer Clock Periods]")
                 plt.ylabel("Counts")
@@ -256,12 +392,9 @@ def test():
             # ------------------------ Distribuzione dei bit -------------------------
             if PLOT.BITS_DISTRIBUTION in TO_PLOT:
                 plotting.info(_plot_item_message.format(PLOT.BITS_DISTRIBUTION))
-                # print(len(gen.deltaT))                  # stampa il numero di deltaT disponibili
-                # print(*gen.randomNumbers, sep="\n")     # stampa numeri casuali disponibili
                 # # Confronta frequenze di 0 e 1 in bits
-                # n0 = gen.randomBits.count(0)
-                # print(n0/len(bits), (len(bits)-n0)/len(bits))
-                plt.hist(bits, bins=2)  # istogramma per confrontare 0 e 1 (i bit)
+                # print(bits_counts / bits_counts.sum())
+                plt.stairs(bits_counts, [0, 0.5, 1], fill=True)  # istogramma per confrontare 0 e 1 (i bit)
                 plt.xlabel("Bit")
                 plt.ylabel("Counts")
                 plt.ylim(bottom=0)
@@ -273,22 +406,17 @@ def test():
             if PLOT.BYTES_DISTRIBUTION in TO_PLOT:
                 plotting.info(_plot_item_message.format(PLOT.BYTES_DISTRIBUTION))
                 # Numeri casuali
-                plt.hist(
-                    nums,
-                    bins=256,
+                plt.stairs(
+                    nums_counts,
+                    np.arange(257),
+                    fill=True,
                     alpha=0.75 if PLOT.BYTES_DISTRIBUTION_LOCAL_MEANS in TO_PLOT else 1,
                 )
 
             if PLOT.BYTES_DISTRIBUTION_LOCAL_MEANS in TO_PLOT:
                 plotting.info(_plot_item_message.format(PLOT.BYTES_DISTRIBUTION_LOCAL_MEANS))
-                # Conta quanti numeri casuali vengono generati in base al loro valore:
-                #   `plt.hist()` lo fa in automatico, ma poiché dobbiamo fare le medie
-                #   locali abbiamo bisogno di ottenere questi conteggi “manualmente”
-                vals = [0] * 256
-                for x in nums:
-                    vals[x] += 1
-                # Disegna le medie locali
-                plt.plot(cyclic_local_means(vals, spread=32))
+                # Disegna le medie locali (al centro di ciascun intervallo)
+                plt.plot(np.arange(256) + 0.5, hist.cyclic_local_means(nums_counts, spread=32))
 
             if PLOT.BYTES_DISTRIBUTION in TO_PLOT or PLOT.BYTES_DISTRIBUTION_LOCAL_MEANS in TO_PLOT:
                 plt.xlabel("Bytes")
@@ -7,16 +7,14 @@ cdef:
 @cython.locals(
     data=list,
     vals=dict,
-    f=object,
     t=object,
     x=object,
     raw_data=dict,
-    branches=dict,
     attr=str,
     i=cython.long,
 )
 cdef list[object] _read(
-    object file,
+    object f,
     type cls,
     str tree,
     list attributes,
@@ -8,7 +8,7 @@ from collections import namedtuple
 from pathlib import Path
 import sys
 import os
-from log import getLogger
+from log import getLogger, Lazy
 
 
 L = getLogger(__name__)
@@ -24,7 +24,7 @@ FORCE_UPROOT = eval(os.environ.get("FORCE_UPROOT", "0") or "0")
 #   Imposta la variabile `ROOT` di conseguenza.
 ROOT: bool
 try:
-    L.debug(f"Environment variable `FORCE_UPROOT` is {'' if FORCE_UPROOT else 'not '}set.")
+    L.debug("Environment variable `FORCE_UPROOT` is %sset.", "" if FORCE_UPROOT else "not ")
     if FORCE_UPROOT:
         raise ModuleNotFoundError
     L.debug("Trying to import `PyROOT`")
@@ -54,27 +54,23 @@ _T = TypeVar("_T", bound=NamedTuple)
 
 
 def _read(
-    file: str | Path,
+    f: File,
     cls: type[_T],
     tree: str,
     attributes: list[str],
     list_conv: list[str],
 ) -> list[_T]:
     # Inizializzazione variabili
-    file = str(Path(file).expanduser().resolve())
     data: list[_T] = []  # Questo sarà il risultato della funzione
     # In `vals` vengono salvati i parametri da passare alla classe nella costruzione dell'oggetto
     vals: dict[str, Any] = {}
 
-    with L.task(f"Reading tree {tree!r} from file {file!r}...") as reading:
+    with L.task(Lazy("Reading tree {!r} from file {!r}...", tree, f.path)) as reading:
+
+        # Leggi l'albero (dal file già aperto)
+        t = f.tree(tree)
 
         if ROOT:  # --- PyROOT ---
-            # Termina il loop degli eventi di PyROOT, in modo che non interferisca con matplotlib
-            PyROOT.keeppolling = 0  # type: ignore
-            # Apri il file
-            f = PyROOT.TFile(file)  # type: ignore
-            # Leggi l'albero
-            t = f.Get(tree)
             # Leggi e salva i dati di interesse
             for x in t:
                 vals.clear()  # Svuota i parametri
@@ -86,24 +82,19 @@ def _read(
                         vals[attr] = getattr(x, attr)
                 # Crea l'oggetto e aggiungilo a `data`
                 data.append(cls(**vals))  # type: ignore
-            # Chiudi il file
-            f.Close()
 
         else:  # --- uproot ---
 
             # Mappa vuota per i dati grezzi
             #   (associa al nome dell'attributo la lista dei valori, ancora da combinare negli oggetti)
             raw_data: dict[str, Any] = {}
-            # Apri l'albero `tree` dal file `file`
-            with uproot.open(f"{file}:{tree}") as t:
-                # Salva i “rami” come mappa
-                branches = dict(t.iteritems())
-                for attr in attributes:
-                    # Converti l'attributo in lista ove necessario
-                    if attr in list_conv:
-                        raw_data[attr] = list(map(list, branches[attr].array()))
-                    else:
-                        raw_data[attr] = list(branches[attr].array())
+            # Leggi soltanto i “rami” richiesti
+            for attr in attributes:
+                # Converti l'attributo in lista ove necessario
+                if attr in list_conv:
+                    raw_data[attr] = list(map(list, t[attr].array()))
+                else:
+                    raw_data[attr] = list(t[attr].array())
 
             # Converti i dati grezzi in lista di oggetti:
             #   scorri gli indici e associa gli attributi corrispondenti, creando l'oggetto
@@ -125,6 +116,109 @@ def _read(
     return data
 
 
+def _cls(
+    attributes: Sequence[str], list_conv: Sequence[str] | None, cls: type[_T] | None, cls_name: str
+) -> tuple[type[_T], list[str], list[str]]:
+    """Determina la classe, gli attributi da leggere e quelli da convertire in liste (vedi `read()`)."""
+    if cls is None:
+        # Non è stata specificata una classe: generane una adeguata ora.
+        cls = namedtuple(cls_name, attributes)  # type: ignore
+        # Se list_conv non è stato specificato, consideralo una lista vuota
+        list_conv = [*(list_conv or ())]
+    else:
+        # La classe è stata specificata: determina `attributes` e `list_conv` a partire da quella.
+        attributes = cls._fields
+        list_conv = [
+            name
+            for name, t in get_type_hints(cls).items()
+            if issubclass(get_origin(t) or t, list)
+        ]
+    return cls, list(attributes), list(list_conv)  # type: ignore
+
+
+class File:
+    """Un file ROOT aperto, da cui leggere più alberi (o più gruppi di rami) senza riaprirlo ogni volta.
+
+    Intestazioni, directory e informazioni sugli streamer vengono lette una volta sola, all'apertura;
+    gli alberi già letti restano in memoria (con i loro dati) finché il file non viene chiuso.
+
+    Utilizzo
+    --------
+    >>> with root.open("file.root") as f:
+    ...     data1 = f.read("Data_1", cls=Event)
+    ...     data2 = f.read("Data_2", cls=Event)
+    ...     timestamps = f.read("Data_1", "Timestamp")  # lo stesso albero, altri rami
+    """
+
+    # --- Variabili d'istanza ---
+    path:    str             # Il percorso (assoluto) del file
+    _handle: Any             # Il file aperto (`TFile` di PyROOT o directory di uproot)
+    _trees:  dict[str, Any]  # Gli alberi già letti, per nome
+
+    def __init__(self, file: Path | str) -> None:
+        self.path = str(Path(file).expanduser().resolve())
+        self._trees = {}
+        if ROOT:  # --- PyROOT ---
+            # Termina il loop degli eventi di PyROOT, in modo che non interferisca con matplotlib
+            PyROOT.keeppolling = 0  # type: ignore
+            self._handle = PyROOT.TFile(self.path)  # type: ignore
+        else:  # --- uproot ---
+            self._handle = uproot.open(self.path)
+
+    def tree(self, name: str) -> Any:
+        """L'albero `name` (letto una volta sola)."""
+        if name not in self._trees:
+            self._trees[name] = self._handle.Get(name) if ROOT else self._handle[name]
+        return self._trees[name]
+
+    # O si specifica la classe tramite il parametro `cls`...
+    @overload
+    def read(self, tree: str, /, *, cls: type[_T]) -> list[_T]:
+        ...
+
+    # ... oppure bisogna specificare `attributes`, `list_conv` e `cls_name`
+    @overload
+    def read(
+        self,
+        tree: str,
+        *attributes: str,
+        list_conv: Sequence[str] | None = None,
+        cls_name: str = "Data",
+    ) -> list[Any]:
+        ...
+
+    def read(
+        self,
+        tree: str,
+        *attributes: str,
+        list_conv: Sequence[str] | None = None,
+        cls: type[_T] | None = None,
+        cls_name: str = "Data",
+    ) -> list[_T]:
+        """Legge l'albero `tree` dal file, come `read()`."""
+        cls, names, lists = _cls(attributes, list_conv, cls, cls_name)
+        return _read(self, cls, tree, names, lists)
+
+    def close(self) -> None:
+        """Chiude il file."""
+        self._trees.clear()
+        if ROOT:
+            self._handle.Close()
+        else:
+            self._handle.close()
+
+    def __enter__(self) -> File:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def open(file: Path | str) -> File:  # pylint: disable=redefined-builtin
+    """Apre il file ROOT `file`, per leggerne uno o più alberi (vedi `File`)."""
+    return File(file)
+
+
 # O si specifica la classe tramite il parametro `cls`...
 @overload
 def read(file: Path | str, tree: str, /, *, cls: type[_T]) -> list[_T]:
@@ -189,29 +283,19 @@ def read(
     >>> root.read("file.root", "Data_R", cls=Event)
     >>> # Per concatenare due file (o due alberi), basta utilizzare l'operatore `+` sui risultati:
     >>> root.read("file.root",  "Data_1", cls=Event) + root.read("file.root",  "Data_2", cls=Event)
+    >>> # (per leggere più alberi dallo stesso file, senza riaprirlo ogni volta, vedi `open()`)
     >>> root.read("file1.root", "Data_R", cls=Event) + root.read("file2.root", "Data_R", cls=Event)
     >>> root.read("file1.root", "Data_1", cls=Event) + root.read("file2.root", "Data_2", cls=Event)
     """
 
-    if cls is None:
-        # Non è stata specificata una classe: generane una adeguata ora.
-        cls = namedtuple(cls_name, attributes)  # type: ignore
-        # Se list_conv non è stato specificato, consideralo una lista vuota
-        list_conv = [*(list_conv or ())]
-    else:
-        # La classe è stata specificata: determina `attributes` e `list_conv` a partire da quella.
-        attributes = cls._fields
-        list_conv = [
-            name
-            for name, t in get_type_hints(cls).items()
-            if issubclass(get_origin(t) or t, list)
-        ]
-
-    return _read(file, cls, tree, list(attributes), list_conv)  # type: ignore
+    # Il file viene aperto e chiuso: per leggere più alberi dallo stesso file, conviene usare `open()`
+    with open(file) as f:
+        return f.read(tree, *attributes, list_conv=list_conv, cls=cls, cls_name=cls_name)  # type: ignore
 
 
 # "Esporta" i simboli di interesse
-__all__ = ["read"]
+#   (`open` resta fuori: con `from root import *` nasconderebbe la funzione predefinita)
+__all__ = ["read", "File"]
 
 
 def test():
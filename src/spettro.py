@@ -2,11 +2,24 @@
 # -*- coding: utf-8 -*-
 """Analisi dello spettro del segnale."""
 from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from collections import defaultdict
 from pathlib import Path
-from typing import Literal, NamedTuple
-import matplotlib.pyplot as plt
-import root
+from typing import Callable, Iterable, Iterator, Literal, NamedTuple
+import argparse
+import signal
+import json
+import time
+import glob
+import csv
+import os
+import numpy as np
 from log import getLogger, taskLogger
+from waveforms import Waveforms
+from hist import Histogram
+import calibrazione
+import features
+import coincidenze
 
 
 # --- Costanti ---
@@ -24,6 +37,24 @@ BASELINE_CALC_MODE: Literal[0, 1] = 0
 #   0: Origine e picco a 1436 keV
 #   1: Picco a 1436 keV e picco a 2600 keV
 CALIBRATION_MODE: Literal[0, 1] = 0
+# Numero di intervalli dello spettro
+SPECTRUM_BINS: int = 2500
+# Area massima dello spettro non calibrato (usato per la calibrazione)
+AREA_MAX: float = 250000
+# Tagli sulla forma degli impulsi (vedi `features.Features`), come limiti `(minimo, massimo)`:
+#   ad esempio, `dict(rms=(None, 10), psd=(0.05, 0.3))` scarta gli eventi rumorosi e quelli con forma anomala
+CUTS: dict[str, tuple[float | None, float | None]] = {}
+# Finestra di pile-up, nelle unità dei Timestamp (ps): gli eventi più vicini di così a un altro vengono scartati
+#   (None per tenerli tutti)
+PILEUP_WINDOW: int | None = None
+# Durata delle finestre temporali dello spettrogramma, nelle unità dei Timestamp (ps)
+TIME_WINDOW: float = 60e12  # 1 minuto
+# Numero di finestre temporali sommate per seguire il picco (e, se richiesto, ricalibrare lo spettro)
+TRACK_WINDOWS: int = 1
+# Ricalibra ogni gruppo di finestre separatamente, per correggere le variazioni di guadagno
+RECALIBRATE: bool = False
+# Formati (estensioni) in cui si può salvare lo spettro
+EXPORT_FORMATS: tuple[str, ...] = (".csv", ".json", ".npz")
 
 
 # --- Modelli ----
@@ -34,6 +65,245 @@ class Event(NamedTuple):
     Samples: list[int]
 
 
+class SpectrumAccumulator(Histogram):
+    """Uno spettro con binning fisso, riempito un blocco di aree alla volta (in memoria costante).
+
+    Gli spettri con lo stesso binning (ad esempio, di file o processi diversi) si possono sommare
+    con `+`, `+=` o `merge()`, e salvare su file con `save()` (e ricaricare con `load()`).
+
+    Esempio
+    -------
+    >>> s = SpectrumAccumulator.linear(0, 3000, 3)
+    >>> s.add([100, 1500, 2999], calibrate=lambda x: 2 * x).counts.tolist(), s.overflow
+    ([1, 0, 1], 1)
+    """
+
+    def add(
+        self, areas: Iterable[float] | np.ndarray, calibrate: Callable[[np.ndarray], np.ndarray] | None = None
+    ) -> SpectrumAccumulator:
+        """Aggiunge allo spettro le aree `areas`, eventualmente calibrate con la funzione `calibrate`."""
+        areas = np.asarray(areas, dtype=np.float64)
+        self.fill(areas if calibrate is None else calibrate(areas))
+        return self
+
+    @classmethod
+    def merge(cls, spectra: Iterable[Histogram]) -> SpectrumAccumulator:
+        """Somma più spettri (con lo stesso binning)."""
+        result: SpectrumAccumulator | None = None
+        for spectrum in spectra:
+            if result is None:
+                result = cls(spectrum.edges)
+            result += spectrum
+        if result is None:
+            raise ValueError("Cannot merge an empty sequence of spectra.")
+        return result
+
+    def calibrated(self, calibrate: Callable[[np.ndarray], np.ndarray]) -> SpectrumAccumulator:
+        """Lo stesso spettro, con gli estremi degli intervalli calibrati con la funzione (crescente) `calibrate`."""
+        result = type(self)(calibrate(self.edges))
+        result.counts = self.counts.copy()
+        result.underflow = self.underflow
+        result.overflow = self.overflow
+        return result
+
+    def plot(self, **kwargs) -> None:
+        """Disegna lo spettro (con `matplotlib`)."""
+        import matplotlib.pyplot as plt  # pylint: disable=import-outside-toplevel
+
+        plt.stairs(self.counts, self.edges, fill=True, **kwargs)
+
+
+class Track(NamedTuple):
+    """La posizione di un picco nel tempo (NaN nelle finestre in cui il fit non è riuscito)."""
+    times:     np.ndarray  # Inizio di ciascun gruppo di finestre (unità dei Timestamp)
+    position:  np.ndarray  # Posizione del picco...
+    dposition: np.ndarray  # ... e la sua incertezza
+
+
+class Spectrogram:
+    """Uno spettro risolto in tempo: istogramma 2D (finestra temporale × area) con binning fisso.
+
+    Le finestre temporali, di durata `window` (nelle unità dei Timestamp), vengono aggiunte quando
+    servono: la memoria occupata dipende dal numero di bin, non dal numero di eventi.
+    Gli spettrogrammi con lo stesso binning si sommano con `+=` (stessa scala dei tempi)
+    o si accodano con `append()` (ad esempio, file acquisiti uno dopo l'altro).
+
+    Esempio
+    -------
+    >>> s = Spectrogram.linear(10, 0, 3, 3).add([1, 2, 25], [0.5, 2.5, 1.5])
+    >>> s.counts.tolist(), s.spectrum().counts.tolist()
+    ([[1, 0, 1], [0, 0, 0], [0, 1, 0]], [1, 1, 1])
+    """
+
+    # --- Variabili d'istanza ---
+    window:    float       # Durata di ciascuna finestra temporale
+    edges:     np.ndarray  # Estremi degli intervalli di area (`n + 1` valori crescenti)
+    counts:    np.ndarray  # Conteggi (una riga per finestra temporale)
+    underflow: np.ndarray  # Aree minori del primo estremo, per finestra
+    overflow:  np.ndarray  # Aree maggiori dell'ultimo estremo, per finestra
+
+    def __init__(self, window: float, edges: Iterable[float] | np.ndarray) -> None:
+        if window <= 0:
+            raise ValueError("The time window must be positive.")
+        self.window = window
+        self.edges = Histogram(edges).edges
+        self.counts = np.zeros((0, len(self.edges) - 1), dtype=np.int64)
+        self.underflow = np.zeros(0, dtype=np.int64)
+        self.overflow = np.zeros(0, dtype=np.int64)
+
+    @classmethod
+    def linear(cls, window: float, lo: float, hi: float, bins: int) -> Spectrogram:
+        """Spettrogramma con `bins` intervalli di area di uguale larghezza tra `lo` e `hi`."""
+        return cls(window, np.linspace(lo, hi, bins + 1))
+
+    @property
+    def windows(self) -> int:
+        """Il numero di finestre temporali."""
+        return len(self.counts)
+
+    @property
+    def times(self) -> np.ndarray:
+        """L'inizio di ciascuna finestra temporale."""
+        return np.arange(self.windows) * self.window
+
+    def _grow(self, windows: int) -> None:
+        """Aggiunge finestre temporali (vuote) fino ad averne `windows`."""
+        if windows > self.windows:
+            extra = windows - self.windows
+            self.counts = np.concatenate([self.counts, np.zeros((extra, self.counts.shape[1]), dtype=np.int64)])
+            self.underflow = np.concatenate([self.underflow, np.zeros(extra, dtype=np.int64)])
+            self.overflow = np.concatenate([self.overflow, np.zeros(extra, dtype=np.int64)])
+
+    def add(self, timestamps: Iterable[float] | np.ndarray, areas: Iterable[float] | np.ndarray) -> Spectrogram:
+        """Aggiunge le aree `areas` degli eventi ai tempi (non negativi) `timestamps`."""
+        timestamps = np.asarray(timestamps)
+        areas = np.asarray(areas, dtype=np.float64)
+        if timestamps.shape != areas.shape:
+            raise ValueError("There must be exactly one timestamp per area.")
+        if not len(areas):
+            return self
+        rows = (timestamps // self.window).astype(np.int64)
+        if rows.min() < 0:
+            raise ValueError("Timestamps must not be negative.")
+        self._grow(int(rows.max()) + 1)
+        bins = self.counts.shape[1]
+        index = np.searchsorted(self.edges, areas, side="right") - 1
+        # L'ultimo intervallo è chiuso a destra
+        index[areas == self.edges[-1]] = bins - 1
+        under = index < 0
+        over = index >= bins
+        self.underflow += np.bincount(rows[under], minlength=self.windows)
+        self.overflow += np.bincount(rows[over], minlength=self.windows)
+        inside = ~(under | over)
+        flat = rows[inside] * bins + index[inside]
+        self.counts += np.bincount(flat, minlength=self.counts.size).reshape(self.counts.shape)
+        return self
+
+    def _check(self, other: Spectrogram) -> None:
+        if self.window != other.window or not np.array_equal(self.edges, other.edges):
+            raise ValueError("Cannot combine spectrograms with different binning.")
+
+    def __iadd__(self, other: Spectrogram) -> Spectrogram:
+        """Somma `other` a questo spettrogramma (con la stessa scala dei tempi)."""
+        if not isinstance(other, Spectrogram):
+            return NotImplemented
+        self._check(other)
+        self._grow(other.windows)
+        n = other.windows
+        self.counts[:n] += other.counts
+        self.underflow[:n] += other.underflow
+        self.overflow[:n] += other.overflow
+        return self
+
+    def append(self, other: Spectrogram) -> Spectrogram:
+        """Accoda `other` (i cui tempi ripartono da zero) dopo l'ultima finestra di questo spettrogramma."""
+        self._check(other)
+        self.counts = np.concatenate([self.counts, other.counts])
+        self.underflow = np.concatenate([self.underflow, other.underflow])
+        self.overflow = np.concatenate([self.overflow, other.overflow])
+        return self
+
+    def spectrum(self, start: int = 0, stop: int | None = None) -> SpectrumAccumulator:
+        """Lo spettro delle aree nelle finestre temporali `[start:stop]` (di default, in tutte)."""
+        result = SpectrumAccumulator(self.edges)
+        result.counts = self.counts[start:stop].sum(axis=0)
+        result.underflow = int(self.underflow[start:stop].sum())
+        result.overflow = int(self.overflow[start:stop].sum())
+        return result
+
+    def groups(self, size: int = 1) -> Iterator[tuple[float, SpectrumAccumulator]]:
+        """L'inizio e lo spettro di ciascun gruppo di `size` finestre temporali consecutive."""
+        for start in range(0, self.windows, size):
+            yield start * self.window, self.spectrum(start, start + size)
+
+    def track(
+        self, line: tuple[float, float] = calibrazione.LINES[0], size: int = TRACK_WINDOWS,
+        search: float = calibrazione.SEARCH,
+    ) -> Track:
+        """Segue nel tempo il picco della riga `line` (energia, posizione nominale).
+
+        Il picco viene cercato in un gruppo di `size` finestre alla volta.
+        """
+        energy, nominal = line
+        times, position, dposition = [], [], []
+        for time_, spectrum in self.groups(size):
+            try:
+                peak = calibrazione.fit_peak(
+                    spectrum, calibrazione.find_peak(spectrum, nominal * (1 - search), nominal * (1 + search)), energy
+                )
+            except ValueError as e:
+                L.debug("No peak at t = %g: %s", time_, e)
+                peak = None
+            times.append(time_)
+            position.append(np.nan if peak is None else peak.position)
+            dposition.append(np.nan if peak is None else peak.dposition)
+        return Track(np.array(times), np.array(position), np.array(dposition))
+
+    def recalibrate(
+        self, edges: Iterable[float] | np.ndarray, fallback: calibrazione.Calibration,
+        mode: Literal[0, 1] = CALIBRATION_MODE, size: int = TRACK_WINDOWS,
+    ) -> SpectrumAccumulator:
+        """Lo spettro in energia (con estremi `edges`), calibrando separatamente ogni gruppo di `size` finestre.
+
+        I conteggi di ciascun intervallo di area vanno nell'intervallo di energia che contiene il suo centro
+        (calibrato); i gruppi che non si riescono a calibrare usano la calibrazione `fallback`.
+        """
+        result = SpectrumAccumulator(edges)
+        failed = 0
+        for _, spectrum in self.groups(size):
+            try:
+                calibrate = calibrazione.calibrate(spectrum, mode)
+            except ValueError:
+                failed += 1
+                calibrate = fallback
+            energies = calibrate(spectrum.centers)
+            index = np.searchsorted(result.edges, energies, side="right") - 1
+            index[energies == result.edges[-1]] = result.bins - 1
+            inside = (index >= 0) & (index < result.bins)
+            result.counts += np.bincount(index[inside], spectrum.counts[inside], result.bins).astype(np.int64)
+            result.underflow += spectrum.underflow + int(spectrum.counts[index < 0].sum())
+            result.overflow += spectrum.overflow + int(spectrum.counts[index >= result.bins].sum())
+        if failed:
+            L.warning(f"Could not recalibrate {failed} group{'s' if failed != 1 else ''} of time windows.")
+        return result
+
+
+class Spectra(NamedTuple):
+    """Lo spettro (non calibrato) delle aree, integrato e risolto in tempo."""
+    spectrum: SpectrumAccumulator
+    spectrogram: Spectrogram
+
+
+class FileSpectrum(NamedTuple):
+    """Lo spettro (non calibrato) delle aree degli eventi di un file, con le statistiche dell'elaborazione."""
+    file: Path
+    spectrum: SpectrumAccumulator
+    spectrogram: Spectrogram
+    events: int     # Numero di eventi letti
+    seconds: float  # Tempo impiegato
+    worker: int     # PID del processo che ha elaborato il file
+
+
 # --- Utility ----
 
 def mean(v: list[float] | list[int]) -> float:
@@ -41,81 +311,204 @@ def mean(v: list[float] | list[int]) -> float:
     return sum(v) / len(v)
 
 
+def baselines(events: list[Event] | Waveforms, n: int | None = None) -> np.ndarray:
+    """Calcola la BASELINE di ogni evento, come media dei suoi primi `n` samples (di default, `BASELINE_CALC_N`)."""
+    if not isinstance(events, Waveforms):
+        events = Waveforms.from_events(events)
+    return events.means(0, BASELINE_CALC_N if n is None else n)
+
+
+def baseline(events: list[Event] | Waveforms, n: int | None = None) -> float:
+    """Calcola la BASELINE comune a tutti gli eventi, come media delle BASELINE dei singoli eventi."""
+    return float(np.mean(baselines(events, n)))
+
+
 # Calcolo delle aree per ogni evento
 @L.task(f"Calculating {'BASELINES and ' if BASELINE_CALC_MODE == 1 else ''}areas")
 def aree(
-    events: list[Event],
+    events: list[Event] | Waveforms,
     BASELINE: float | None = None,
     max_area: float | None = None,
     min_samples: int = 0,
     max_samples: int | None = None,
-) -> list[float]:
-    """Calcola l'area di ogni evento."""
+    where: np.ndarray | None = None,
+) -> np.ndarray:
+    """Calcola l'area di ogni evento (con NumPy, per tutti gli eventi contemporaneamente).
+
+    Con `where` (una maschera o un vettore di indici, ad esempio da `features.Features.cut()`),
+    vengono considerati soltanto gli eventi selezionati.
+    """
     logger = taskLogger(__name__)
-    logger.debug(f"{max_area=}, samples range = [{min_samples}, {max_samples}]")
+    logger.debug("max_area=%r, samples range = [%s, %s]", max_area, min_samples, max_samples)
 
-    aree_calcolate: list[float] = []
-    for event in events:
-        # Se necessario, calcola la BASELINE per questo evento
-        if BASELINE_CALC_MODE == 1:
-            BASELINE = mean(event.Samples[:BASELINE_CALC_N])
-        assert BASELINE is not None
+    if not isinstance(events, Waveforms):
+        events = Waveforms.from_events(events)
 
-        # Estrazione dei samples dell'evento tra `min_samples` e `max_samples`
-        samples = event.Samples[min_samples:max_samples]
+    # Se necessario, calcola la BASELINE di ciascun evento
+    if BASELINE_CALC_MODE == 1:
+        BASELINE = baselines(events)  # type: ignore
+    assert BASELINE is not None
 
-        # Calcolo dell'area:
-        #    area = ((numero di samples · baseline) - somma dei samples) · distanza temporale
-        temp_area = (len(samples) * BASELINE - sum(samples)) * T
+    # Calcolo dell'area, considerando soltanto i samples tra `min_samples` e `max_samples`:
+    #    area = ((numero di samples · baseline) - somma dei samples) · distanza temporale
+    #    (la selezione si applica alle aree: gli eventi non vengono copiati, e le somme cumulative restano valide)
+    lo, hi = events.window(min_samples, max_samples)
+    aree_calcolate = ((hi - lo) * BASELINE - events.between(lo, hi)) * T
+    if where is not None:
+        aree_calcolate = aree_calcolate[where]
 
-        # Se non sono stati impostati limiti all'area o area < del limite ...
-        if max_area is None or temp_area < max_area:
-            # ... salva l'area nel vettore `aree_calcolate`
-            aree_calcolate.append(temp_area)
+    # Se sono stati impostati limiti all'area, tieni soltanto le aree minori del limite
+    if max_area is not None:
+        aree_calcolate = aree_calcolate[aree_calcolate < max_area]
 
     return aree_calcolate
 
 
-# --- Programma principale ----
+def files(patterns: Iterable[str | Path]) -> list[Path]:
+    """Espande i pattern (glob, come `run*/data*.root`) in `patterns`; gli altri percorsi restano invariati.
 
-def main():
-    """Funzione principale."""
+    Ogni file compare una volta sola (alla prima occorrenza), anche se indicato più volte o da più pattern.
+    """
+    result: dict[Path, Path] = {}
+    for pattern in map(str, patterns):
+        pattern = os.path.expanduser(pattern)
+        if glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern))
+            if not matches:
+                L.warning(f"No file matches {pattern!r}.")
+            paths = [Path(match) for match in matches]
+        else:
+            paths = [Path(pattern)]
+        for path in paths:
+            result.setdefault(path.resolve(), path)
+    return list(result.values())
 
-    # ----------------------------- Apertura file -----------------------------
-    SRC = Path(__file__).parent
-    t = root.read(SRC / "data.root", "Data_R", cls=Event)
-
-    # ------------------------ Calcolo della baseline -------------------------
-    BASELINE = None
-    if BASELINE_CALC_MODE == 0:
-        with L.task("Calculating baseline...") as calc:
-            medie = []
-            for event in t:
-                # Calcola della media dei primi `BASELINE_CALC_N` samples richiamando la funzione "mean"
-                # Salva la media nel vettore "medie"
-                medie.append(mean(event.Samples[:BASELINE_CALC_N]))
-            # Salva la media del vettore "medie" come "BASELINE"
-            BASELINE = mean(medie)
-            # BASELINE = 13313.683338704632      # già calcolata, all'occorrenza
-            calc.result = f"it's {BASELINE}"
 
-    # ---------------------- Calibrazione spettro in keV ----------------------
-    X1 = 118900  # picco a 1436 keV
-    X2 = 211400  # picco a 2600 keV
-    Y1 = 1436    # keV del decadimento 138La -> 138Ba (picco centrale)
-    Y2 = 2600    # keV del decadimento 227Ac (primo picco)
-    if CALIBRATION_MODE == 0:
-        m = Y1 / X1
-        q = 0
-    else:
-        m = (Y1 - Y2) / (X1 - X2)
-        q = Y1 - m * X1
-
-    # Funzione di calibrazione
-    def calibrate(x):
-        return m * x + q
+def file_spectrum(file: Path | str, tree: str = "Data_R") -> FileSpectrum:
+    """Calcola BASELINE e aree degli eventi del file `file`, e ne riempie lo spettro (non calibrato)."""
+    start = time.perf_counter()
+    t = Waveforms.from_file(file, tree)
+    BASELINE = baseline(t) if BASELINE_CALC_MODE == 0 else None
+    where = None
+    if CUTS:
+        shape = features.extract(t, BASELINE_CALC_N, BASELINE_CALC_N, 150, BASELINE=BASELINE)
+        where = shape.cut(**CUTS)
+    if PILEUP_WINDOW is not None:
+        # Le aree degli eventi in pile-up sono sommate a quelle dell'evento vicino
+        keep = coincidenze.accepted(coincidenze.flags(t.timestamps, PILEUP_WINDOW), coincidenze.Timing.PILEUP)
+        where = keep if where is None else where & keep
+    # Aree calcolate con samples nell'intervallo [BASELINE_CALC_N, 150]
+    areas = aree(t, BASELINE=BASELINE, min_samples=BASELINE_CALC_N, max_samples=150, where=where)
+    # Lo spettro viene diviso in finestre temporali (nella stessa passata): quello integrato è la loro somma
+    timestamps = t.timestamps if where is None else t.timestamps[where]
+    spectrogram = Spectrogram.linear(TIME_WINDOW, 0, AREA_MAX, SPECTRUM_BINS).add(timestamps, areas)
+    spectrum = spectrogram.spectrum()
+    return FileSpectrum(Path(file), spectrum, spectrogram, len(t), time.perf_counter() - start, os.getpid())
+
+
+def spectra(paths: Iterable[Path | str], tree: str = "Data_R", jobs: int | None = None) -> Spectra:
+    """Somma gli spettri (non calibrati) dei file `paths`, elaborati in parallelo su `jobs` processi.
+
+    Con `jobs=None` i file vengono elaborati uno dopo l'altro in questo processo; con `jobs=0`,
+    in un processo per CPU. Gli spettri vengono sommati, e gli spettrogrammi accodati, nell'ordine dei file.
+    """
+    paths = list(paths)
+    if not paths:
+        raise ValueError("No input files.")
+    # Eventi e tempo totali di ciascun processo
+    workers: defaultdict[int, list[float]] = defaultdict(lambda: [0, 0.0])
+    with L.task(f"Processing {len(paths)} file{'s' if len(paths) != 1 else ''}...") as processing:
+        start = time.perf_counter()
+        if jobs is None:
+            results = map(file_spectrum, paths, [tree] * len(paths))
+            executor = None
+        else:
+            # I processi ignorano Ctrl+C: lo gestisce soltanto questo
+            executor = ProcessPoolExecutor(
+                jobs or None, initializer=signal.signal, initargs=(signal.SIGINT, signal.SIG_IGN)
+            )
+            results = executor.map(file_spectrum, paths, [tree] * len(paths))
+        try:
+            partials = []
+            spectrogram: Spectrogram | None = None
+            for result in results:
+                processing.debug(
+                    "%r: %d events in %.3f s (%.0f events/s, worker %d)",
+                    str(result.file), result.events, result.seconds, result.events / result.seconds, result.worker,
+                )
+                partials.append(result.spectrum)
+                spectrogram = result.spectrogram if spectrogram is None else spectrogram.append(result.spectrogram)
+                workers[result.worker][0] += result.events
+                workers[result.worker][1] += result.seconds
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        for worker, (events, seconds) in sorted(workers.items()):
+            processing.info(f"Worker {worker}: {events} events in {seconds:.3f} s ({events / seconds:.0f} events/s)")
+        total = sum(events for events, _ in workers.values())
+        processing.result = f"{total} events, {total / (time.perf_counter() - start):.0f} events/s"
+        assert spectrogram is not None
+        return Spectra(SpectrumAccumulator.merge(partials), spectrogram)
+
+
+def export(
+    path: Path | str, raw: SpectrumAccumulator, calibrate: calibrazione.Calibration,
+    spectrogram: Spectrogram | None = None,
+) -> None:
+    """Salva lo spettro (non calibrato) e la calibrazione nel file `path`, in base all'estensione.
+
+    * `.csv`: una riga per intervallo (estremi in area e in energia, conteggi); la calibrazione nei commenti iniziali;
+    * `.json`: lo spettro (vedi `Histogram.to_dict()`) e la calibrazione (con i picchi);
+    * `.npz`: lo spettro, i parametri della calibrazione e, se specificato, lo spettrogramma.
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown spectrum file format {path.suffix!r}: use {', '.join(map(repr, EXPORT_FORMATS))}.")
+    energies = calibrate(raw.edges)
+    with L.task(f"Saving spectrum to {str(path)!r}..."):
+        if suffix == ".csv":
+            with path.open("w", newline="") as f:
+                for key, value in calibrate.to_dict().items():
+                    if key != "peaks":
+                        f.write(f"# {key} = {value!r}\n")
+                f.write(f"# underflow = {raw.underflow}\n# overflow = {raw.overflow}\n")
+                writer = csv.writer(f)
+                writer.writerow(["area_low", "area_high", "energy_low", "energy_high", "counts"])
+                writer.writerows(zip(
+                    raw.edges[:-1].tolist(), raw.edges[1:].tolist(),
+                    energies[:-1].tolist(), energies[1:].tolist(), raw.counts.tolist(),
+                ))
+        elif suffix == ".json":
+            with path.open("w") as f:
+                json.dump(dict(spectrum=raw.to_dict(), calibration=calibrate.to_dict()), f, indent=2)
+                f.write("\n")
+        else:
+            arrays = dict(
+                edges=raw.edges, counts=raw.counts, underflow=raw.underflow, overflow=raw.overflow,
+                m=calibrate.m, dm=calibrate.dm, q=calibrate.q, dq=calibrate.dq, cov=calibrate.cov,
+            )
+            if spectrogram is not None:
+                arrays.update(window=spectrogram.window, spectrogram=spectrogram.counts)
+            with path.open("wb") as f:
+                np.savez_compressed(f, **arrays)
+
+
+def plot(
+    raw: SpectrumAccumulator, calibrate: calibrazione.Calibration, spectrogram: Spectrogram | None = None,
+    energy: SpectrumAccumulator | None = None, *, show: bool = True, directory: Path | None = None, fmt: str = "png",
+) -> None:
+    """Disegna lo spettro calibrato (o, se specificato, lo spettro in energia `energy`) e la stabilità del picco.
+
+    Se `directory` è specificata, i grafici vengono salvati lì (come `spectrum.<fmt>` e `drift.<fmt>`).
+    """
+    # La libreria `matplotlib` serve soltanto qua: importarla all'inizio di tutto il programma è sconveniente
+    import matplotlib.pyplot as plt  # pylint: disable=import-outside-toplevel
+
+    def done(name: str) -> None:
+        if directory is not None:
+            plt.savefig(directory / f"{name}.{fmt}")
 
-    # -------------------------------- Grafici --------------------------------
     # # Stampa i samples
     # for i, event in enumerate(t):
     #     if i > 10:
@@ -127,15 +520,101 @@ def main():
     # plt.hist(aree(t, BASELINE), bins = 10000)
     # plt.show
 
-    # Spettro calibrato in keV, aree calcolate con samples nell'intervallo [BASELINE_CALC_N, 150]
-    plt.hist(list(map(calibrate, aree(t, BASELINE=BASELINE, min_samples=BASELINE_CALC_N, max_samples=150))), bins=2500)
+    # Spettro calibrato in keV (la calibrazione è lineare: basta calibrare gli estremi degli intervalli),
+    #   oppure ricalibrato finestra per finestra, per correggere le variazioni di guadagno
+    plt.figure()
+    (raw.calibrated(calibrate) if energy is None else energy).plot()
     plt.yscale("log")
     plt.xlabel("Energy [keV]")
     plt.ylabel("Counts")
     plt.xlim(left=0, right=calibrate(221400))
     plt.ylim(top=2500 * T, bottom=0.175 * T)
     plt.title("Background energy spectrum")
-    plt.show()
+    done("spectrum")
+
+    # Posizione del picco a 1436 keV nel tempo (stabilità del guadagno)
+    if spectrogram is not None and spectrogram.windows > TRACK_WINDOWS:
+        track = spectrogram.track()
+        plt.figure()
+        plt.errorbar(track.times / 3.6e15, track.position, track.dposition, fmt=".")
+        plt.xlabel("Time [h]")
+        plt.ylabel("Peak position [area]")
+        plt.title(f"{calibrazione.LINES[0][0]} keV peak position")
+        done("drift")
+
+    # Tutti i grafici vengono mostrati insieme, alla fine
+    if show:
+        plt.show()
+    plt.close("all")
+
+
+# --- Programma principale ----
+
+def main():
+    """Funzione principale."""
+    SRC = Path(__file__).parent
+    parser = argparse.ArgumentParser(description="Compute the calibrated energy spectrum of one or more files.")
+    parser.add_argument(
+        "files", nargs="*", default=[str(SRC / "data.root")],
+        help="ROOT files or glob patterns, like 'run*/*.root' (default: data.root)",
+    )
+    parser.add_argument("--tree", default="Data_R", help="name of the tree (default: Data_R)")
+    parser.add_argument(
+        "--jobs", type=int, nargs="?", const=0,
+        help="number of processes (default: a single one; without a value: one per CPU)",
+    )
+    parser.add_argument(
+        "--output", type=Path, action="append",
+        help="save the spectrum and its calibration to this file (.csv, .json or .npz; can be repeated)",
+    )
+    parser.add_argument("--plot", type=Path, metavar="DIR", help="save plots to this directory")
+    parser.add_argument("--plot-format", default="png", help="plot file format (default: png)")
+    parser.add_argument("--batch", action="store_true", help="do not open any window (no display needed)")
+    args = parser.parse_args()
+    # (prima di elaborare i file, che può richiedere molto tempo)
+    for path in args.output or ():
+        if path.suffix.lower() not in EXPORT_FORMATS:
+            parser.error(f"unknown format of output file {str(path)!r}: use {', '.join(EXPORT_FORMATS)}")
+
+    # ----------------------- Apertura file e calcolo aree ---------------------
+    #   (la prima volta, i samples di ogni file vengono salvati con le loro somme cumulative in
+    #   `<file>.<tree>.waveforms.npz`, in modo che le letture successive, e il calcolo delle aree su
+    #   qualsiasi finestra, siano immediati; la BASELINE viene calcolata file per file)
+    raw, spectrogram = spectra(files(args.files), args.tree, args.jobs)
+
+    # ---------------------- Calibrazione spettro in keV ----------------------
+    # I picchi vengono cercati e fittati sullo spettro (non calibrato) delle aree
+    try:
+        calibrate = calibrazione.calibrate(raw, CALIBRATION_MODE)
+    except ValueError as e:
+        # Usa le posizioni nominali dei picchi, lette a occhio sul grafico
+        L.warning(f"Automatic calibration failed ({e}): using the nominal peak positions.")
+        (Y1, X1), (Y2, X2) = calibrazione.LINES
+        if CALIBRATION_MODE == 0:
+            m = Y1 / X1
+            q = 0.0
+        else:
+            m = (Y1 - Y2) / (X1 - X2)
+            q = Y1 - m * X1
+        calibrate = calibrazione.Calibration(m, 0.0, q, 0.0, 0.0, ())
+
+    # ------------------------------ Esportazione ------------------------------
+    for path in args.output or ():
+        export(path, raw, calibrate, spectrogram)
+
+    # -------------------------------- Grafici --------------------------------
+    if args.plot is not None or not args.batch:
+        if args.batch:
+            # Nessuna finestra: disegna direttamente su file
+            import matplotlib  # pylint: disable=import-outside-toplevel
+            matplotlib.use("Agg")
+        if args.plot is not None:
+            args.plot.mkdir(parents=True, exist_ok=True)
+        energy = (
+            spectrogram.recalibrate(np.linspace(0, calibrate(221400), SPECTRUM_BINS + 1), calibrate)
+            if RECALIBRATE else None
+        )
+        plot(raw, calibrate, spectrogram, energy, show=not args.batch, directory=args.plot, fmt=args.plot_format)
 
 
 # Chiama `main()` quando il programma viene eseguito direttamente
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Forme d'onda (samples) di molti eventi in un unico array, con operazioni vettoriali (con NumPy)."""
+from __future__ import annotations
+from typing import Iterable, Protocol, Sequence
+from pathlib import Path
+import os
+import numpy as np
+from log import getLogger
+
+
+L = getLogger(__name__)  # Il logger associato a questo modulo
+
+# Estensione aggiunta al nome del file di dati per la sua copia in formato NumPy
+CACHE_SUFFIX: str = ".waveforms.npz"
+
+
+class HasSamples(Protocol):
+    """Un evento con la sua forma d'onda."""
+
+    @property
+    def Samples(self) -> Sequence[int]:  # pylint: disable=invalid-name
+        """I samples dell'evento."""
+
+
+class HasTimestamp(HasSamples, Protocol):
+    """Un evento con la sua forma d'onda e il suo tempo."""
+
+    @property
+    def Timestamp(self) -> int:  # pylint: disable=invalid-name
+        """Il tempo dell'evento."""
+
+
+class Waveforms:
+    """Le forme d'onda di più eventi, concatenate in un unico array.
+
+    Gli eventi possono avere un numero diverso di samples: quelli dell'evento `i` sono
+    `samples[offsets[i]:offsets[i + 1]]`. I samples restano nel loro tipo originale (ad esempio `int16`),
+    mentre le somme vengono sempre calcolate con interi a 64 bit.
+
+    Con le somme cumulative (`with_prefix()`, salvate su file insieme ai samples) la somma
+    su qualsiasi finestra costa O(1) per evento, invece di O(numero di samples nella finestra).
+
+    Esempio
+    -------
+    >>> wf = Waveforms.from_arrays([[1, 2, 3, 4], [5, 6]])
+    >>> wf.sums(1, 3).tolist(), wf.counts(1, 3).tolist()
+    ([5, 6], [2, 1])
+    >>> wf.means(None, -1).tolist()
+    [2.0, 5.0]
+    """
+
+    # --- Variabili d'istanza ---
+    # pubbliche
+    samples: np.ndarray  # I samples di tutti gli eventi, uno dopo l'altro
+    offsets: np.ndarray  # Indice del primo sample di ciascun evento (più la lunghezza totale, alla fine)
+    prefix:  np.ndarray | None  # Somme cumulative: `prefix[k]` è la somma dei primi `k` samples (se calcolate)
+    timestamps: np.ndarray | None  # Tempo di ciascun evento (se noto)
+    # protette
+    _length: int | None  # Il numero di samples di ciascun evento, se è lo stesso per tutti
+
+    def __init__(
+        self,
+        samples: np.ndarray,
+        offsets: np.ndarray,
+        prefix: np.ndarray | None = None,
+        timestamps: np.ndarray | None = None,
+    ) -> None:
+        self.samples = np.asarray(samples)
+        if self.samples.dtype.kind not in "iu":
+            raise TypeError(f"Samples must be integers, not {self.samples.dtype}.")
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        if self.offsets.ndim != 1 or not len(self.offsets) or self.offsets[0] != 0 \
+                or self.offsets[-1] != len(self.samples) or np.any(np.diff(self.offsets) < 0):
+            raise ValueError("Offsets must increase from 0 to the total number of samples.")
+        if prefix is not None and len(prefix) != len(self.samples) + 1:
+            raise ValueError("Prefix sums must have one more element than the samples.")
+        self.prefix = prefix
+        if timestamps is not None:
+            timestamps = np.asarray(timestamps, dtype=np.int64)
+            if timestamps.shape != (len(self),):
+                raise ValueError("There must be exactly one timestamp per event.")
+        self.timestamps = timestamps
+        lengths = self.lengths
+        self._length = int(lengths[0]) if len(lengths) and np.all(lengths == lengths[0]) else None
+
+    def with_prefix(self) -> Waveforms:
+        """Calcola (se necessario) le somme cumulative dei samples, e restituisce l'oggetto stesso."""
+        if self.prefix is None:
+            self.prefix = np.concatenate([[0], np.cumsum(self.samples, dtype=np.int64)])
+        return self
+
+    def save(self, path: Path | str) -> None:
+        """Salva le forme d'onda (con somme cumulative e tempi, se presenti) nel file (NumPy, `.npz`) `path`."""
+        arrays = dict(samples=self.samples, offsets=self.offsets)
+        if self.prefix is not None:
+            arrays["prefix"] = self.prefix
+        if self.timestamps is not None:
+            arrays["timestamps"] = self.timestamps
+        with open(path, "wb") as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path: Path | str) -> Waveforms:
+        """Carica le forme d'onda salvate con `save()`."""
+        with np.load(path) as data:
+            return cls(
+                data["samples"],
+                data["offsets"],
+                data["prefix"] if "prefix" in data.files else None,
+                data["timestamps"] if "timestamps" in data.files else None,
+            )
+
+    @classmethod
+    def from_file(cls, file: Path | str, tree: str = "Data_R", *, cache: bool = True) -> Waveforms:
+        """Legge le forme d'onda (e i tempi) dall'albero `tree` del file ROOT `file`, con le somme cumulative.
+
+        Con `cache`, il risultato viene salvato accanto al file (con il nome dell'albero ed estensione `CACHE_SUFFIX`)
+        e riutilizzato nelle letture successive, finché il file di dati non viene modificato.
+        """
+        import root  # pylint: disable=import-outside-toplevel
+
+        file = Path(file)
+        # (ogni albero ha la sua copia: `<file>.<tree>.waveforms.npz`)
+        path = file.with_name(f"{file.name}.{tree}{CACHE_SUFFIX}")
+        if cache and path.exists() and path.stat().st_mtime_ns >= file.stat().st_mtime_ns:
+            with L.task(f"Loading cached waveforms from {str(path)!r}...") as loading:
+                result = cls.load(path)
+                loading.result = f"read {len(result)} events"
+            # (le copie salvate dalle versioni precedenti potrebbero non avere somme cumulative o tempi)
+            if result.prefix is not None and result.timestamps is not None:
+                return result
+        result = cls.from_events(root.read(file, tree, "Timestamp", "Samples", list_conv=["Samples"]))
+        if len(result.samples):
+            # I samples letti (liste di interi Python) vengono salvati nel tipo con segno più piccolo che li contiene
+            #   (ad esempio `int16`, per un digitizer a 14 bit): le somme vengono comunque calcolate con interi a 64 bit
+            largest = max(-int(result.samples.min()), int(result.samples.max()))
+            result.samples = result.samples.astype(np.min_scalar_type(-largest - 1))
+        result.with_prefix()
+        if cache:
+            # Scrive su un file temporaneo e poi lo rinomina: più processi possono leggere lo stesso file
+            #   contemporaneamente, senza mai trovare (o lasciare) una copia scritta a metà
+            temporary = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            result.save(temporary)
+            os.replace(temporary, path)
+        return result
+
+    @classmethod
+    def from_arrays(cls, arrays: Iterable[Sequence[int] | np.ndarray]) -> Waveforms:
+        """Crea l'oggetto a partire dai samples di ciascun evento (gli array NumPy mantengono il loro tipo)."""
+        arrays = [np.asarray(array) for array in arrays]
+        lengths = np.fromiter(map(len, arrays), dtype=np.int64, count=len(arrays))
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        # (gli eventi vuoti vengono saltati: non hanno un tipo significativo)
+        nonempty = [array for array in arrays if len(array)]
+        samples = np.concatenate(nonempty) if nonempty else np.zeros(0, dtype=np.int64)
+        return cls(samples, offsets)
+
+    @classmethod
+    def from_events(cls, events: Iterable[HasSamples | HasTimestamp]) -> Waveforms:
+        """Crea l'oggetto a partire dagli eventi (ad esempio, letti con `root.read()`), con i tempi se li hanno."""
+        events = list(events)
+        result = cls.from_arrays(event.Samples for event in events)
+        if events and hasattr(events[0], "Timestamp"):
+            result.timestamps = np.fromiter(
+                (event.Timestamp for event in events), dtype=np.int64, count=len(events)  # type: ignore
+            )
+        return result
+
+    @classmethod
+    def from_matrix(cls, matrix: np.ndarray) -> Waveforms:
+        """Crea l'oggetto a partire da una matrice (un evento per riga, tutti con lo stesso numero di samples)."""
+        matrix = np.asarray(matrix)
+        n, length = matrix.shape
+        return cls(matrix.ravel(), np.arange(n + 1) * length)
+
+    def __len__(self) -> int:
+        """Il numero di eventi."""
+        return len(self.offsets) - 1
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """Il numero di samples di ciascun evento."""
+        return np.diff(self.offsets)
+
+    def matrix(self) -> np.ndarray:
+        """I samples come matrice (un evento per riga), se tutti gli eventi hanno lo stesso numero di samples."""
+        lengths = self.lengths
+        if len(lengths) and np.any(lengths != lengths[0]):
+            raise ValueError("Events have different numbers of samples.")
+        return self.samples.reshape(len(self), -1 if len(self) else 0)
+
+    def window(self, start: int | None = None, stop: int | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """Gli estremi (assoluti) della finestra `[start:stop]` di ciascun evento, con la semantica di `slice`."""
+        first = self.offsets[:-1]
+        if self._length is not None:
+            # Tutti gli eventi hanno la stessa lunghezza: la finestra è la stessa per tutti
+            lo, hi, _ = slice(start, stop).indices(self._length)
+            return first + lo, first + max(lo, hi)
+        lengths = self.lengths
+
+        def bound(i: int | None, default: np.ndarray | int) -> np.ndarray:
+            if i is None:
+                return np.broadcast_to(default, lengths.shape)
+            # Gli indici negativi si contano dalla fine dell'evento
+            return np.clip(i + lengths if i < 0 else np.full_like(lengths, i), 0, lengths)
+
+        lo = bound(start, 0)
+        hi = np.maximum(bound(stop, lengths), lo)
+        return first + lo, first + hi
+
+    def counts(self, start: int | None = None, stop: int | None = None) -> np.ndarray:
+        """Il numero di samples di ciascun evento nella finestra `[start:stop]`."""
+        lo, hi = self.window(start, stop)
+        return hi - lo
+
+    def sums(self, start: int | None = None, stop: int | None = None) -> np.ndarray:
+        """La somma dei samples di ciascun evento nella finestra `[start:stop]`."""
+        lo, hi = self.window(start, stop)
+        return self.between(lo, hi)
+
+    def between(self, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+        """La somma dei samples tra gli indici (assoluti, come quelli restituiti da `window()`) `lo` e `hi`."""
+        if self.prefix is not None:
+            return self.prefix[hi] - self.prefix[lo]
+        if not len(self.samples):
+            return np.zeros(len(lo), dtype=np.int64)
+        # `reduceat` somma tra indici consecutivi: [lo0, hi0, lo1, hi1, ...] dà le finestre nelle posizioni pari
+        #   (gli indici devono essere minori della lunghezza: quelli finali vengono spostati indietro di uno...)
+        last = len(self.samples) - 1
+        bounds = np.minimum(np.stack([lo, hi], axis=1).ravel(), last)
+        sums = np.add.reduceat(self.samples, bounds, dtype=np.int64)[::2]
+        # ... e l'ultimo sample va aggiunto a parte
+        sums += np.where((hi > last) & (bounds[1::2] > lo), self.samples[last], 0)
+        # Se la finestra è vuota, `reduceat` restituisce il sample in `lo` invece di 0
+        return np.where(hi > lo, sums, 0)
+
+    def means(self, start: int | None = None, stop: int | None = None) -> np.ndarray:
+        """La media dei samples di ciascun evento nella finestra `[start:stop]` (NaN se è vuota)."""
+        lo, hi = self.window(start, stop)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.between(lo, hi) / (hi - lo)
+
+    def __getitem__(self, index: np.ndarray | slice) -> Waveforms:
+        """Seleziona alcuni eventi (con una maschera, un vettore di indici o uno `slice`)."""
+        index = np.arange(len(self))[index]
+        lengths = self.lengths[index]
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        # Indice (in `samples`) di ciascun sample degli eventi selezionati
+        take = np.arange(int(offsets[-1])) - np.repeat(offsets[:-1] - self.offsets[index], lengths)
+        timestamps = None if self.timestamps is None else self.timestamps[index]
+        result = type(self)(self.samples[take], offsets, timestamps=timestamps)
+        return result if self.prefix is None else result.with_prefix()
+
+    def __repr__(self) -> str:
+        """Rappresentazione dell'oggetto come stringa."""
+        return f"<{type(self).__name__} of {len(self)} events, {len(self.samples)} samples>"
+
+
+__all__ = ["CACHE_SUFFIX", "HasSamples", "HasTimestamp", "Waveforms"]